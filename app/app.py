@@ -3,20 +3,38 @@ import sys
 import pandas as pd
 import cv2
 import numpy as np
-import io
 import datetime
 from itertools import combinations
-from flask import Flask, render_template, request, session, Response
+from flask import Flask, render_template, request, session, Response, jsonify, url_for, g
 from werkzeug.utils import secure_filename
 from skimage.metrics import structural_similarity as ssim
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
-import re
+import time
+import atexit
+import cProfile
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 # ---------------- CONFIG ----------------
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(PROJECT_ROOT)
 
+from src.image_index import (ImageFeatureIndex, histogram_from_image, grayscale_thumbnail, score_histograms,
+                             ssim_shortlist, risk_level, parallel_scan, HIGH_CORRELATION, MODERATE_CORRELATION,
+                             HIGH_SSIM, MODERATE_SSIM, shutdown_pool as shutdown_image_pool)
+from src.perceptual_hash import image_hashes, hamming_distances
+from src.bom_screening import screen_bom
+from src.anomaly_detector import score_segments, shutdown_pool as shutdown_anomaly_pool
+from src.job_queue import JobQueue
+from src.result_store import ResultStore
+from src.content_cache import CheckCache, store_stream, file_digest, cache_key
+from src.excel_report import stream_report
+from src.consolidation import consolidate
+from src import metrics
+from src.export_master import ExportMasterCache
+from src.document_similarity import get_top_similar_docs_for_file
+from src.semantic_index import get_top_semantic_docs_for_file
+
 app = Flask(__name__, static_folder=os.path.join(PROJECT_ROOT, 'static'))
 app.secret_key = 'shashank'
 
@@ -25,12 +43,56 @@ UPLOAD_FOLDER = os.path.join(PROJECT_ROOT, 'uploads')
 BRAND_IMAGES_FOLDER = os.path.join(PROJECT_ROOT, 'src', 'images')
 DOCUMENTS_FOLDER = os.path.join(PROJECT_ROOT, 'src', 'documents')
 DATA_FOLDER = os.path.join(PROJECT_ROOT, 'data')
+IMAGE_INDEX_FOLDER = os.path.join(DATA_FOLDER, 'image_index')
 for folder in [UPLOAD_FOLDER, BRAND_IMAGES_FOLDER, DOCUMENTS_FOLDER, DATA_FOLDER]:
     os.makedirs(folder, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Number of best histogram matches that are re-checked with SSIM in the image check
+app.config['SSIM_SHORTLIST'] = 25
+# Number of closest product descriptions reported by the document check
+app.config['DOC_TOP_K'] = 5
+# Procurement anomaly stage of the BOM check (IsolationForest per HS code / category market segment)
+app.config['ANOMALY_CHECK'] = True
+app.config['ANOMALY_WORKERS'] = None
+# Image check: 'index' (feature index, default) or 'scan' (decode the catalog on a process pool, one
+# shard per brand folder, stopping after IMAGE_SCAN_TIME_BUDGET seconds); the pool also speeds up index rebuilds
+app.config['IMAGE_CHECK_MODE'] = 'index'
+app.config['IMAGE_SCAN_WORKERS'] = None
+app.config['IMAGE_SCAN_TIME_BUDGET'] = 20
+# Worker threads for background (async=1) analyses
+app.config['JOB_WORKERS'] = 2
+# Threads shared by the concurrent BOM / image / document checks of all running analyses;
+# BOM_CHECK_PROCESS runs the pandas-heavy BOM check in a separate worker process instead
+app.config['CHECK_WORKERS'] = 6
+# Seconds an analysis stays available to /generate_report
+app.config['RESULT_TTL'] = 24 * 60 * 60
+# Check results are memoized by (upload digest, reference data version, settings), up to
+# CHECK_CACHE_MAX_BYTES of compressed results, least recently used evicted first
+app.config['CHECK_CACHE'] = True
+app.config['CHECK_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+# Per-request profiling with an 'X-Profile: 1' header or '?profile=1': the checks run inline under
+# cProfile, the stats go to data/profiles/ and stage timings come back in a Server-Timing header
+app.config['ALLOW_PROFILING'] = False
+app.config['BOM_CHECK_PROCESS'] = False
+# 'tfidf' (default) or 'semantic' (sentence-transformers embeddings with an IVF index)
+app.config['DOC_SEARCH_MODE'] = 'tfidf'
+DOC_SEARCH = {
+    'tfidf': (get_top_similar_docs_for_file, "TF-IDF", 0.50, 0.30),
+    'semantic': (get_top_semantic_docs_for_file, "Semantic", 0.75, 0.60),
+}
 
 # Master Data File Paths
 EXPORT_DATA_PATH = os.path.join(DATA_FOLDER, 'export_export_data_filled_smart.csv')
+EXPORT_SNAPSHOT_PATH = os.path.join(DATA_FOLDER, 'export_master.pkl')
+JOBS_DB_PATH = os.path.join(DATA_FOLDER, 'jobs.sqlite')
+RESULTS_DB_PATH = os.path.join(DATA_FOLDER, 'results.sqlite')
+CHECK_CACHE_DB_PATH = os.path.join(DATA_FOLDER, 'check_cache.sqlite')
+PROFILES_FOLDER = os.path.join(DATA_FOLDER, 'profiles')
+PRODUCT_DESCRIPTIONS_PATH = os.path.join(PROJECT_ROOT, 'src', 'product_descriptions.csv')
+
+# Brand catalog features kept in sync with BRAND_IMAGES_FOLDER; the first image check brings them up to date
+image_index = ImageFeatureIndex(BRAND_IMAGES_FOLDER, IMAGE_INDEX_FOLDER, max_workers=app.config['IMAGE_SCAN_WORKERS'])
+image_index.load()
 
 
 # ---------------- HELPERS ----------------
@@ -48,40 +110,402 @@ def parse_csv_flexible(file_path):
     return df
 
 
-def compute_histogram(image_path):
+# Export master, parsed once and reloaded only when the CSV changes on disk
+export_master = ExportMasterCache(EXPORT_DATA_PATH, parse_csv_flexible, snapshot_path=EXPORT_SNAPSHOT_PATH)
+
+
+def compute_image_features(image_path):
+    """Decodes an image once and returns (histogram, grayscale thumbnail), or (None, None)."""
     try:
         img_cv = cv2.imread(image_path)
-        if img_cv is None: return None
-        img_cv = cv2.resize(img_cv, (256, 256))
-        hist = cv2.calcHist([img_cv], [0, 1, 2], None, [8, 8, 8], [0, 256, 0, 256, 0, 256])
-        return cv2.normalize(hist, hist).flatten().astype('float32')
+        if img_cv is None: return None, None
+        return histogram_from_image(img_cv), grayscale_thumbnail(img_cv)
     except Exception:
-        return None
+        return None, None
 
 
-def compute_ssim_score(image1_path, image2_path):
+def compute_ssim_from_gray(gray1, gray2):
+    """SSIM between two 256x256 grayscale thumbnails (see compute_image_features)."""
     try:
-        img1 = cv2.imread(image1_path);
-        img2 = cv2.imread(image2_path)
-        if img1 is None or img2 is None: return None
-        img1 = cv2.resize(img1, (256, 256));
-        img2 = cv2.resize(img2, (256, 256))
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY);
-        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-        score, _ = ssim(gray1, gray2, full=True)
+        score, _ = ssim(np.asarray(gray1), np.asarray(gray2), full=True)
         return round(float(score), 4)
     except Exception:
         return None
 
 
-def get_top_similar_docs(uploaded_path, docs_folder_path):
+# ---------------- ANALYSIS ----------------
+
+def save_upload(file_storage):
+    """
+    Streams an uploaded file into UPLOAD_FOLDER under the SHA-256 of its content and
+    returns (path, digest); a file uploaded again is not stored a second time.
+    """
+    extension = os.path.splitext(secure_filename(file_storage.filename))[1]
+    return store_stream(file_storage.stream, app.config['UPLOAD_FOLDER'], extension)
+
+
+def display_name(path):
+    return os.path.splitext(os.path.basename(path))[0].replace('_', ' ').strip()
+
+
+def collect_inputs(req):
+    """Saves the files of a /submit_all request and returns the analysis inputs (paths and options)."""
+    inputs = {'brand_folder': req.form.get('brand_folder', 'all')}
+    bom_file = req.files.get('bom_file')
+    if bom_file and bom_file.filename.endswith('.csv'):
+        inputs['bom_path'], inputs['bom_digest'] = save_upload(bom_file)
+    image_file = req.files.get('image_file')
+    if image_file and image_file.filename != '':
+        inputs['image_path'], inputs['image_digest'] = save_upload(image_file)
+        inputs['image_name'] = display_name(secure_filename(image_file.filename)) or inputs['image_digest'][:12]
+    doc_file = req.files.get('doc_file')
+    if doc_file and doc_file.filename != '':
+        inputs['doc_path'], inputs['doc_digest'] = save_upload(doc_file)
+        inputs['doc_name'] = display_name(secure_filename(doc_file.filename)) or inputs['doc_digest'][:12]
+    return inputs
+
+
+def run_bom_check(bom_path, anomaly_workers=None):
+    """
+    BOM screening against the export master plus the procurement anomaly stage;
+    `anomaly_workers` overrides ANOMALY_WORKERS (1 fits the models in-process).
+    """
+    bom_results = {'high': [], 'low': []}
+    with metrics.span('bom.csv_parse'):
+        bom_df = parse_csv_flexible(bom_path)
+    metrics.inc('bom_rows_total', len(bom_df))
+
+    with metrics.span('bom.export_master'):
+        export_data = export_master.get()
+    if export_data.empty:
+        bom_results['high'].append({
+            "Product": "Configuration Error",
+            "Risk Level": "High",
+            "Finding": "Master export data file is missing."
+        })
+        bom_df = pd.DataFrame()
+
+    if not bom_df.empty:
+        with metrics.span('bom.export_lookup'):
+            bom_findings = screen_bom(bom_df, export_data.index)
+        for risk_level, items in bom_findings.items():
+            bom_results.setdefault(risk_level, []).extend(items)
+
+        if app.config['ANOMALY_CHECK']:
+            with metrics.span('bom.anomaly'):
+                anomalies = score_segments(export_data.df, bom_df, max_workers=app.config['ANOMALY_WORKERS']
+                                           if anomaly_workers is None else anomaly_workers)
+            for result in anomalies:
+                if not result['anomaly']: continue
+                row = bom_df.iloc[result['row']]
+                risk_level = "High" if result['risk_score'] >= 75 else "Moderate"
+                market = ("across all exports" if result['segment'] == 'All'
+                          else f"for the {result['segment']} market")
+                bom_results.setdefault(risk_level.lower(), []).append({
+                    "Category": str(row.get('Category', '')).strip(),
+                    "HS Code": str(row.get('HS Code', '')).strip(),
+                    "Company": row.get("Company", "N/A"),
+                    "Product": row.get("Product", "N/A"),
+                    "Risk Level": risk_level,
+                    "Type": "Procurement Anomaly",
+                    "Finding": f"Procurement anomaly: quantity/weight/value is unusual {market} "
+                               f"(risk score {result['risk_score']:.1f})."
+                })
+    return bom_results
+
+
+def add_visual_match(image_results, uploaded_image_name, brand, brand_image_name, similarity_score, ssim_score):
+    """Adds a High/Moderate visual similarity item to the image results; returns False for Low."""
+    level = risk_level(similarity_score, ssim_score)
+    if level == "Low":
+        return False
+    ssim_text = f"{ssim_score:.2f}" if ssim_score is not None else "N/A"
+    image_results[level.lower()].append(
+        {"Uploaded Image": uploaded_image_name, "Brand Image": brand_image_name,
+         "Risk Level": level, "Finding": f"{level} visual similarity (Correlation: {similarity_score:.2f}, SSIM: {ssim_text})",
+         "Category": brand, "Company": os.path.splitext(brand_image_name)[0].replace('_', ' ').strip()})
+    return True
+
+
+def refresh_image_index():
+    """Throttled image_index.refresh(), decoding on a pool of the current IMAGE_SCAN_WORKERS size."""
+    # Same size as the scans, so the shared pool is not rebuilt back and forth
+    image_index.max_workers = app.config['IMAGE_SCAN_WORKERS']
+    return image_index.refresh()
+
+
+def run_image_check(image_path, brand_folder='all', uploaded_image_name=None):
+    """Duplicate, histogram and SSIM matching of an uploaded image against the brand catalog."""
+    image_results = {'high': [], 'moderate': [], 'low': []}
+    uploaded_image_name = uploaded_image_name or display_name(image_path)
+    with metrics.span('image.decode'):
+        uploaded_hist, uploaded_gray = compute_image_features(image_path)
+    if uploaded_hist is None:
+        return image_results
+    brands = None if brand_folder == 'all' else [brand_folder]
+    if app.config['IMAGE_CHECK_MODE'] == 'scan':
+        with metrics.span('image.scan'):
+            matches, complete = parallel_scan(BRAND_IMAGES_FOLDER, uploaded_hist, uploaded_gray, brands,
+                                              app.config['IMAGE_SCAN_WORKERS'], app.config['IMAGE_SCAN_TIME_BUDGET'])
+        for match in matches:
+            add_visual_match(image_results, uploaded_image_name, match['brand'], match['name'],
+                             match['correlation'], match['ssim'])
+        if not complete:
+            image_results['low'].append({"Uploaded Image": uploaded_image_name, "Risk Level": "Low",
+                                         "Finding": "Image scan time budget reached; only part of the catalog was compared."})
+        image_match_found = bool(matches)
+    else:
+        with metrics.span('image.index_refresh'):
+            refresh_image_index()
+        catalog = image_index.snapshot()
+        entries, unit_hists, brand_thumbs = catalog['entries'], catalog['unit_histograms'], catalog['thumbnails']
+        rows = image_index.rows_for_brands(brands, entries)
+        metrics.inc('images_scanned_total', len(rows))
+        image_match_found = False
+
+        # Cloned photos: pHash lookup in the index, no catalog image is decoded
+        uploaded_phash, uploaded_dhash = image_hashes(uploaded_gray)
+        selected_rows = set(rows)
+        duplicate_rows = set()
+        with metrics.span('image.duplicates'):
+            duplicates = catalog['phash_index'].search(uploaded_phash)
+        for row, distance in duplicates:
+            if row not in selected_rows: continue
+            duplicate_rows.add(row)
+            image_match_found = True
+            dhash_distance = int(hamming_distances(catalog['hashes'][row:row + 1, 1], uploaded_dhash)[0])
+            match_type = "Exact Duplicate" if distance == 0 and dhash_distance == 0 else "Near-Duplicate"
+            brand_image_name = entries[row]['name']
+            image_results['high'].append(
+                {"Uploaded Image": uploaded_image_name, "Brand Image": brand_image_name,
+                 "Risk Level": "High", "Match Type": match_type,
+                 "Finding": f"{match_type} of catalog image (pHash distance: {distance}, dHash distance: {dhash_distance})",
+                 "Category": entries[row]['brand'],
+                 "Company": os.path.splitext(brand_image_name)[0].replace('_', ' ').strip()})
+
+        # Stage one: histogram correlation for every candidate; stage two: SSIM on the shortlist only
+        with metrics.span('image.histogram'):
+            hist_result = score_histograms(uploaded_hist, unit_hists[rows], top_k=app.config['SSIM_SHORTLIST'])
+        for position in ssim_shortlist(hist_result, app.config['SSIM_SHORTLIST']):
+            row = rows[position]
+            if row in duplicate_rows: continue
+            with metrics.span('image.ssim'):
+                ssim_score = compute_ssim_from_gray(uploaded_gray, brand_thumbs[row])
+            metrics.inc('ssim_calls_total')
+            if add_visual_match(image_results, uploaded_image_name, entries[row]['brand'], entries[row]['name'],
+                                float(hist_result['scores'][position]), ssim_score):
+                image_match_found = True
+    if not image_match_found:
+        image_results['low'].append({"Uploaded Image": uploaded_image_name, "Risk Level": "Low",
+                                     "Finding": "No significant visual similarity."})
+    return image_results
+
+
+def run_doc_check(doc_path, uploaded_doc_name=None):
+    """Similarity of an uploaded document to the product descriptions corpus."""
+    doc_results = {'high': [], 'moderate': [], 'low': []}
+    uploaded_doc_name = uploaded_doc_name or display_name(doc_path)
+    search_docs, score_label, high_threshold, moderate_threshold = DOC_SEARCH[app.config['DOC_SEARCH_MODE']]
     try:
-        with open(uploaded_path, 'r', encoding='utf-8', errors='ignore') as f:
-            uploaded_text = f.read()
-        return [("sample_proprietary_doc.txt", 0.91)] if "proprietary" in uploaded_text.lower() else [
-            ("generic_manual.txt", 0.55)]
-    except Exception:
-        return []
+        with metrics.span('doc.search'):
+            doc_matches = search_docs(doc_path, PRODUCT_DESCRIPTIONS_PATH, app.config['DOC_TOP_K'])
+    except (FileNotFoundError, ValueError, ImportError) as e:
+        print(f"Document check unavailable: {e}")
+        doc_results['high'].append({
+            "Product": "Configuration Error",
+            "Risk Level": "High",
+            "Finding": "Product descriptions data file is missing or invalid."
+        })
+        doc_matches = []
+    doc_match_found = False
+    for match in doc_matches:
+        score = match['score']
+        risk_level = "High" if score > high_threshold else "Moderate" if score > moderate_threshold else "Low"
+        if risk_level == "Low": continue
+        doc_match_found = True
+        doc_results[risk_level.lower()].append(
+            {"Uploaded Document": uploaded_doc_name, "Brand Document": match['filename'],
+             "Similarity Score": round(score, 4), "Risk Level": risk_level, "Category": match['product'],
+             "Snippet": match['snippet'],
+             "Finding": f"{risk_level} textual similarity to {match['product']} descriptions ({score_label}: {score:.2f})"})
+    if not doc_match_found:
+        doc_results['low'].append({"Uploaded Document": uploaded_doc_name, "Risk Level": "Low",
+                                    "Finding": "No significant textual similarity."})
+    return doc_results
+
+
+_check_executor = ThreadPoolExecutor(max_workers=app.config['CHECK_WORKERS'], thread_name_prefix='check')
+_bom_process_pool = None
+_bom_process_pool_lock = threading.Lock()
+
+
+def bom_check_executor():
+    """Executor for the BOM check: the shared thread pool, or a worker process with BOM_CHECK_PROCESS."""
+    global _bom_process_pool
+    if not app.config['BOM_CHECK_PROCESS']:
+        return _check_executor
+    with _bom_process_pool_lock:
+        if _bom_process_pool is None:
+            _bom_process_pool = ProcessPoolExecutor(max_workers=1)
+        return _bom_process_pool
+
+
+@atexit.register
+def shutdown_pools():
+    """Stops the BOM check, anomaly model and image decode worker processes at interpreter exit."""
+    global _bom_process_pool
+    with _bom_process_pool_lock:
+        if _bom_process_pool is not None:
+            _bom_process_pool.shutdown(wait=True, cancel_futures=True)
+            _bom_process_pool = None
+    shutdown_anomaly_pool()
+    shutdown_image_pool()
+
+
+def run_check(name, function, *args):
+    with metrics.span(name):
+        return function(*args)
+
+
+# Memoized check results, shared by the web app and the batch CLI workers
+check_cache = CheckCache(CHECK_CACHE_DB_PATH, max_bytes=app.config['CHECK_CACHE_MAX_BYTES'])
+
+
+def check_cache_key(name, inputs):
+    """
+    Cache key of a check: its input file digest, the version of the reference data it is
+    compared with and the settings its findings depend on. None when it is not cacheable
+    (time-budgeted catalog scans).
+    """
+    path = inputs[f'{name}_path']
+    digest = inputs.get(f'{name}_digest') or file_digest(path)
+    if name == 'bom':
+        return cache_key(name, digest, export_master.get().version, app.config['ANOMALY_CHECK'])
+    if name == 'image':
+        if app.config['IMAGE_CHECK_MODE'] == 'scan':
+            return None
+        refresh_image_index()
+        return cache_key(name, digest, image_index.version, inputs.get('brand_folder', 'all'),
+                         inputs.get('image_name') or display_name(path), app.config['SSIM_SHORTLIST'],
+                         [HIGH_CORRELATION, MODERATE_CORRELATION, HIGH_SSIM, MODERATE_SSIM])
+    stat = os.stat(PRODUCT_DESCRIPTIONS_PATH) if os.path.exists(PRODUCT_DESCRIPTIONS_PATH) else None
+    mode = app.config['DOC_SEARCH_MODE']
+    return cache_key(name, digest, stat and [stat.st_mtime_ns, stat.st_size], mode, DOC_SEARCH[mode][1:],
+                     inputs.get('doc_name') or display_name(path), app.config['DOC_TOP_K'])
+
+
+def cacheable(results):
+    """Configuration errors are not memoized, so they clear as soon as the data is fixed."""
+    return not any(item.get('Product') == "Configuration Error" for items in results.values() for item in items)
+
+
+def run_analysis(inputs, progress=None, inline=False, use_cache=None):
+    """
+    Runs every check for which `inputs` (see collect_inputs) has a file, concurrently,
+    then the consolidation step once all of them are done. `progress(stage, fraction)`
+    is called as each check finishes. With `inline` the checks run one after another in
+    the calling thread (used when a request is profiled). Checks whose results are in
+    the check cache are not run again, unless `use_cache` (default CHECK_CACHE) is False.
+    """
+    progress = progress or (lambda stage, fraction: None)
+    all_results = {'bom': {'high': [], 'low': []}, 'image': {'high': [], 'moderate': [], 'low': []},
+                   'doc': {'high': [], 'moderate': [], 'low': []}, 'internal_sim': []}
+    calls = []
+    if inputs.get('bom_path'):
+        calls.append(('bom', run_bom_check, (inputs['bom_path'],)))
+    if inputs.get('image_path'):
+        calls.append(('image', run_image_check,
+                      (inputs['image_path'], inputs.get('brand_folder', 'all'), inputs.get('image_name'))))
+    if inputs.get('doc_path'):
+        calls.append(('doc', run_doc_check, (inputs['doc_path'], inputs.get('doc_name'))))
+
+    keys = {}
+    if app.config['CHECK_CACHE'] if use_cache is None else use_cache:
+        pending = []
+        for name, function, args in calls:
+            with metrics.span('check_cache.lookup'):
+                keys[name] = check_cache_key(name, inputs)
+                cached = check_cache.get(keys[name]) if keys[name] else None
+            if cached is None:
+                pending.append((name, function, args))
+            else:
+                all_results[name] = cached
+        calls = pending
+
+    def finish(name, results):
+        all_results[name] = results
+        if keys.get(name) and cacheable(results):
+            check_cache.put(keys[name], results)
+
+    if inline:
+        for finished, (name, function, args) in enumerate(calls, start=1):
+            finish(name, run_check(name, function, *args))
+            progress(name, round(0.9 * finished / len(calls), 3))
+    else:
+        checks = {}
+        for name, function, args in calls:
+            executor = bom_check_executor() if name == 'bom' else _check_executor
+            if executor is _check_executor:
+                # Copy the context so the check's spans reach a profiled request
+                future = executor.submit(contextvars.copy_context().run, run_check, name, function, *args)
+            else:
+                # Inside the BOM worker process the anomaly models are fitted in-process: a pool
+                # started there is never shut down and hangs the worker at exit
+                future = executor.submit(function, *args, anomaly_workers=1)
+            checks[future] = name
+        for finished, future in enumerate(as_completed(checks), start=1):
+            finish(checks[future], future.result())
+            progress(checks[future], round(0.9 * finished / len(checks), 3))
+    progress('consolidation', 0.9)
+    with metrics.span('consolidation'):
+        return consolidate(all_results)
+
+
+# Analysis results live server-side; the session only holds their id
+result_store = ResultStore(RESULTS_DB_PATH, ttl=app.config['RESULT_TTL'])
+
+# Background analyses for /submit_all?async=1, persisted in SQLite
+job_queue = JobQueue(JOBS_DB_PATH, run_analysis, max_workers=app.config['JOB_WORKERS'], ttl=app.config['RESULT_TTL'])
+
+
+# ---------------- METRICS ----------------
+
+@app.before_request
+def start_request_timing():
+    g.request_start = time.perf_counter()
+    if app.config['ALLOW_PROFILING'] and '1' in (request.headers.get('X-Profile'), request.args.get('profile')):
+        g.spans, g.spans_token = metrics.collect_spans()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@app.after_request
+def record_request_timing(response):
+    endpoint = request.endpoint or 'unknown'
+    metrics.observe('http_request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    profiler = g.get('profiler')
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(PROFILES_FOLDER, exist_ok=True)
+        profile_path = os.path.join(PROFILES_FOLDER, f"{endpoint}-{datetime.datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+        profiler.dump_stats(profile_path)
+        response.headers['Server-Timing'] = metrics.server_timing(g.spans)
+        response.headers['X-Profile-File'] = os.path.relpath(profile_path, PROJECT_ROOT)
+    return response
+
+
+@app.teardown_request
+def stop_span_collection(error=None):
+    token = g.pop('spans_token', None)
+    if token is not None:
+        metrics.reset_spans(token)
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Counters and latency histograms in the Prometheus text format."""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 
 # ---------------- ROUTES ----------------
@@ -102,258 +526,43 @@ def index():
 
 @app.route('/submit_all', methods=['POST'])
 def submit_all():
-    """Handles file uploads and runs all analysis checks."""
-    all_results = {'bom': {'high': [], 'low': []}, 'image': {'high': [], 'moderate': [], 'low': []},
-                   'doc': {'high': [], 'low': []}, 'internal_sim': []}
-
-    # --- BOM CHECK ---
-    bom_file = request.files.get('bom_file')
-    if bom_file and bom_file.filename.endswith('.csv'):
-        filename = secure_filename(bom_file.filename)
-        bom_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        bom_file.save(bom_path)
-        bom_df = parse_csv_flexible(bom_path)
-
-        try:
-            export_df = parse_csv_flexible(EXPORT_DATA_PATH)
-        except FileNotFoundError:
-            all_results['bom']['high'].append({
-                "Product": "Configuration Error",
-                "Risk Level": "High",
-                "Finding": "Master export data file is missing."
-            })
-            bom_df = pd.DataFrame()
-
-        if not bom_df.empty:
-            for _, row in bom_df.iterrows():
-                category = str(row.get('Category', '')).strip()
-                hs_code = str(row.get('HS Code', '')).strip()
-
-                row_data = {
-                    "Category": category,
-                    "HS Code": hs_code,
-                    "Company": row.get("Company", "N/A"),
-                    "Product": row.get("Product", "N/A")
-                }
-
-                exact_match = export_df[
-                    (export_df['Category'].str.strip().str.lower() == category.lower()) &
-                    (export_df['HS Code'].astype(str).str.strip() == hs_code)
-                    ]
-
-                if not exact_match.empty:
-                    row_data.update({
-                        "Risk Level": "High",
-                        "Finding": "Category and HS Code both found in export list."
-                    })
-                    all_results['bom']['high'].append(row_data)
-                    continue
-
-                hs_match = export_df[export_df['HS Code'].astype(str).str.strip() == hs_code]
-                cat_match = export_df[export_df['Category'].str.strip().str.lower() == category.lower()]
-
-                if not hs_match.empty or not cat_match.empty:
-                    row_data.update({
-                        "Risk Level": "Moderate",
-                        "Finding": "Either Category or HS Code matches, but not both."
-                    })
-                    all_results['bom'].setdefault('moderate', []).append(row_data)
-                    continue
-
-                desc_match = any(category.lower() in str(exp_desc).lower() for exp_desc in export_df['Product Description'].dropna())
-                if desc_match:
-                    row_data.update({
-                        "Risk Level": "Low",
-                        "Finding": "Partial description similarity found in export list."
-                    })
-                    all_results['bom']['low'].append(row_data)
-                else:
-                    row_data.update({
-                        "Risk Level": "Low",
-                        "Finding": "No strong match, only weak/description similarity."
-                    })
-                    all_results['bom']['low'].append(row_data)
-
-    # --- IMAGE CHECK ---
-    image_file = request.files.get('image_file')
-    if image_file and image_file.filename != '':
-        filename = secure_filename(image_file.filename)
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        image_file.save(save_path)
-        uploaded_image_name = os.path.splitext(filename)[0].replace('_', ' ').strip()
-        uploaded_hist = compute_histogram(save_path)
-        if uploaded_hist is not None:
-            selected_brand = request.form.get('brand_folder', 'all')
-            brand_folders = [selected_brand] if selected_brand != 'all' else sorted(
-                [d for d in os.listdir(BRAND_IMAGES_FOLDER) if os.path.isdir(os.path.join(BRAND_IMAGES_FOLDER, d))])
-            image_match_found = False
-            for brand in brand_folders:
-                brand_images_path = os.path.join(BRAND_IMAGES_FOLDER, brand)
-                for brand_image_name in os.listdir(brand_images_path):
-                    if not brand_image_name.lower().endswith(('.png', '.jpg', '.jpeg')): continue
-                    brand_image_path = os.path.join(brand_images_path, brand_image_name)
-                    if os.path.isfile(brand_image_path):
-                        brand_hist = compute_histogram(brand_image_path)
-                        if brand_hist is None: continue
-                        similarity_score = cv2.compareHist(uploaded_hist, brand_hist, cv2.HISTCMP_CORREL)
-                        ssim_score = compute_ssim_score(save_path, brand_image_path)
-                        risk_level = "Low"
-                        if similarity_score > 0.85 or (ssim_score is not None and ssim_score > 0.80):
-                            risk_level = "High"
-                        elif similarity_score > 0.65 or (ssim_score is not None and ssim_score > 0.60):
-                            risk_level = "Moderate"
-                        if risk_level != "Low":
-                            image_match_found = True
-                            ssim_text = f"{ssim_score:.2f}" if ssim_score is not None else "N/A"
-                            finding = f"{risk_level} visual similarity (Correlation: {similarity_score:.2f}, SSIM: {ssim_text})"
-                            category = brand
-                            company = os.path.splitext(brand_image_name)[0].replace('_', ' ').strip()
-                            all_results['image'][risk_level.lower()].append(
-                                {"Uploaded Image": uploaded_image_name, "Brand Image": brand_image_name,
-                                 "Risk Level": risk_level, "Finding": finding, "Category": category,
-                                 "Company": company})
-            if not image_match_found:
-                all_results['image']['low'].append({"Uploaded Image": uploaded_image_name, "Risk Level": "Low",
-                                                    "Finding": "No significant visual similarity."})
-
-    # --- CONSOLIDATION STEP ---
-    # --- CONSOLIDATION STEP ---
-    high_risk_bom_items = all_results['bom']['high']
-    high_risk_image_items = all_results['image']['high']
-    high_risk_doc_items = all_results['doc']['high']
-
-    bom_items_to_remove, image_items_to_remove, doc_items_to_remove = [], [], []
-
-    # 🔹 BOM ↔ Image cross validation
-    for bom_item in high_risk_bom_items:
-        bom_words = set(re.sub(r'[\W_]+', ' ', bom_item.get('Category', '')).lower().split())
-        for image_item in high_risk_image_items:
-            image_words = set(re.sub(r'[\W_]+', ' ', image_item.get('Category', '')).lower().split())
-            if bom_words and image_words and bom_words.intersection(image_words):
-                all_results['internal_sim'].append({
-                    "Type": "BOM-Image Cross-Validation",
-                    "Risk Level": "High",
-                    "Product": bom_item.get('Product'),
-                    "Category": bom_item.get('Category'),
-                    "Company": bom_item.get('Company'),
-                    "Finding": f"BOM high-risk item confirmed by Image (match: {image_item.get('Brand Image')})."
-                })
-                bom_items_to_remove.append(bom_item)
-                image_items_to_remove.append(image_item)
-                break
-
-    # 🔹 BOM ↔ Document cross validation
-    for bom_item in high_risk_bom_items:
-        bom_words = set(re.sub(r'[\W_]+', ' ', bom_item.get('Category', '')).lower().split())
-        for doc_item in high_risk_doc_items:
-            doc_words = set(re.sub(r'[\W_]+', ' ', doc_item.get('Category', '')).lower().split())
-            if bom_words and doc_words and bom_words.intersection(doc_words):
-                all_results['internal_sim'].append({
-                    "Type": "BOM-Document Cross-Validation",
-                    "Risk Level": "High",
-                    "Product": bom_item.get('Product'),
-                    "Category": bom_item.get('Category'),
-                    "Company": bom_item.get('Company'),
-                    "Finding": f"BOM high-risk item confirmed by Document (doc: {doc_item.get('Finding')})."
-                })
-                bom_items_to_remove.append(bom_item)
-                doc_items_to_remove.append(doc_item)
-                break
-
-    # 🔹 Image ↔ Document cross validation
-    for image_item in high_risk_image_items:
-        image_words = set(re.sub(r'[\W_]+', ' ', image_item.get('Category', '')).lower().split())
-        for doc_item in high_risk_doc_items:
-            doc_words = set(re.sub(r'[\W_]+', ' ', doc_item.get('Category', '')).lower().split())
-            if image_words and doc_words and image_words.intersection(doc_words):
-                all_results['internal_sim'].append({
-                    "Type": "Image-Document Cross-Validation",
-                    "Risk Level": "High",
-                    "Product": image_item.get('Uploaded Image'),
-                    "Category": image_item.get('Category'),
-                    "Company": image_item.get('Company'),
-                    "Finding": f"Image high-risk item confirmed by Document (doc: {doc_item.get('Finding')})."
-                })
-                image_items_to_remove.append(image_item)
-                doc_items_to_remove.append(doc_item)
-                break
-
-    # Remove confirmed items from standalone lists
-    all_results['bom']['high'] = [i for i in high_risk_bom_items if i not in bom_items_to_remove]
-    all_results['image']['high'] = [i for i in high_risk_image_items if i not in image_items_to_remove]
-    all_results['doc']['high'] = [i for i in high_risk_doc_items if i not in doc_items_to_remove]
-
-    session['analysis_results'] = all_results
-    return render_template('results.html', results=all_results)
+    """Handles file uploads and runs all analysis checks (in the background with async=1)."""
+    inputs = collect_inputs(request)
+    if request.values.get('async') == '1':
+        job_id = job_queue.submit(inputs)
+        return jsonify({'job_id': job_id, 'status_url': url_for('job_status', job_id=job_id)}), 202
+
+    profiling = g.get('profiler') is not None
+    all_results = run_analysis(inputs, inline=profiling, use_cache=False if profiling else None)
+    session['analysis_result_id'] = result_store.put(all_results)
+    with metrics.span('render'):
+        return render_template('results.html', results=all_results)
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Progress of a background analysis; with format=html a finished job renders like /submit_all."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job id.'}), 404
+    if request.args.get('format') == 'html' and job['status'] == 'done':
+        session['analysis_result_id'] = result_store.put(job['result'])
+        return render_template('results.html', results=job['result'])
+    return jsonify(job)
 
 
 @app.route('/generate_report', methods=['GET'])
 def generate_report():
     """Generates the consolidated Excel report."""
-    all_results = session.get('analysis_results', {})
+    all_results = result_store.get(session.get('analysis_result_id'))
     if not all_results:
         return Response("No analysis results found.", mimetype='text/plain', status=404)
 
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "IP Risk Report"
-    headers = ["Analysis Type", "Risk Level", "Category", "Product", "Company", "Finding"]
-    ws.append(headers)
-    for cell in ws[1]: cell.font = Font(bold=True)
-
-    red_fill = PatternFill(start_color="FFC7CE", fill_type="solid")
-    orange_fill = PatternFill(start_color="FFEB9C", fill_type="solid")
-    green_fill = PatternFill(start_color="C6EFCE", fill_type="solid")
-    blue_fill = PatternFill(start_color="DDEBF7", fill_type="solid")
-
-    def get_risk_fill(risk_level):
-        rl = str(risk_level).lower()
-        if "high" in rl: return red_fill
-        if "moderate" in rl: return orange_fill
-        if "low" in rl: return green_fill
-        return None
-
-    # 1. Print Combined (Cross-Validation) Results FIRST
-    for item in all_results.get('internal_sim', []):
-        row = [item.get('Type'), item.get('Risk Level'), item.get('Category'), item.get('Product'), item.get('Company'),
-               item.get('Finding')]
-        ws.append(row)
-        for cell in ws[ws.max_row]: cell.fill = blue_fill
-
-    # 2. Print Remaining Standalone Results
-    for category_key in ['bom', 'image', 'doc']:
-        for risk_level, items in all_results.get(category_key, {}).items():
-            for item in items:
-                if category_key == 'bom':
-                    row = ["BOM", item.get('Risk Level'), item.get('Category'), item.get('Product'), item.get('Company'),
-                           item.get('Finding')]
-                elif category_key == 'image':
-                    finding = item.get('Finding', '')
-                    if item.get('Risk Level', 'low').lower() != 'low':
-                        finding += f" (Match: {item.get('Brand Image', 'N/A')})"
-                    row = ["Image", item.get('Risk Level'), item.get('Category'), item.get('Uploaded Image'),
-                           item.get('Company'), finding]
-                else:
-                    continue
-                ws.append(row)
-                for cell in ws[ws.max_row]: cell.fill = get_risk_fill(item.get('Risk Level'))
-
-    # Auto-adjust column widths
-    for col in ws.columns:
-        max_length = 0
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length: max_length = len(str(cell.value))
-            except:
-                pass
-        ws.column_dimensions[col[0].column_letter].width = (max_length + 2)
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
     current_date = datetime.datetime.now().strftime("%Y-%m-%d")
-    return Response(output.getvalue(), mimetype="application/vnd.openxmlformats-officedocument-spreadsheetml-sheet",
-                    headers={"Content-Disposition": f"attachment;filename=ip_risk_report_{current_date}.xlsx"})
+    metrics.inc('reports_total')
+    return Response(stream_report(all_results), mimetype="application/vnd.openxmlformats-officedocument-spreadsheetml-sheet",
+                    headers={"Content-Disposition": f"attachment;filename=ip_risk_report_{current_date}.xlsx"},
+                    direct_passthrough=True)
 
 
 if __name__ == '__main__':
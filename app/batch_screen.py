@@ -0,0 +1,173 @@
+"""
+Headless bulk screening: runs the /submit_all checks of app.py over whole directories
+or a manifest of submissions on a process pool, streaming findings as they complete.
+
+    python app/batch_screen.py --bom-dir boms/ --image-dir images/ --output findings.jsonl
+    python app/batch_screen.py --manifest submissions.csv --format csv --output findings.csv
+
+A manifest is a CSV with an 'id' column and any of 'bom', 'image', 'doc' (file paths,
+relative to the manifest) and 'brand_folder'; the files of one row are screened and
+consolidated together, like one web submission. Directory inputs make one submission per
+file. Finished submission ids are appended to the checkpoint file (default: output +
+'.done'); a rerun skips them and appends to the same output.
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(APP_DIR)
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DOC_EXTENSIONS = ('.txt',)
+CSV_COLUMNS = ["Submission", "Analysis Type", "Risk Level", "Category", "Product", "Company", "Finding"]
+
+_app = None
+
+
+def _init_worker():
+    """Imports the app once per worker; its image/export/document indexes are loaded from disk."""
+    global _app
+    import app as screening_app
+    # The batch pool already uses every core: no further process fan-out inside a worker
+    screening_app.app.config['BOM_CHECK_PROCESS'] = False
+    screening_app.app.config['ANOMALY_WORKERS'] = 1
+    screening_app.app.config['IMAGE_SCAN_WORKERS'] = 1
+    _app = screening_app
+
+
+def screen_submission(submission):
+    """Runs every check of one submission; returns (id, results, error)."""
+    try:
+        return submission['id'], _app.run_analysis(submission['inputs']), None
+    except Exception as e:
+        return submission['id'], None, f"{type(e).__name__}: {e}"
+
+
+def _files(folder, extensions):
+    if not folder:
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith(extensions) and os.path.isfile(os.path.join(folder, name)))
+
+
+def collect_submissions(args):
+    """Submissions as [{'id', 'inputs'}], inputs in the format of app.collect_inputs()."""
+    submissions = []
+    for kind, folder, extensions in (('bom', args.bom_dir, ('.csv',)), ('image', args.image_dir, IMAGE_EXTENSIONS),
+                                     ('doc', args.doc_dir, DOC_EXTENSIONS)):
+        for path in _files(folder, extensions):
+            inputs = {'brand_folder': args.brand_folder, f'{kind}_path': os.path.abspath(path)}
+            submissions.append({'id': f"{kind}:{os.path.relpath(path, folder)}", 'inputs': inputs})
+
+    if args.manifest:
+        base = os.path.dirname(os.path.abspath(args.manifest))
+        with open(args.manifest, 'r', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                inputs = {'brand_folder': (row.get('brand_folder') or '').strip() or args.brand_folder}
+                for kind in ('bom', 'image', 'doc'):
+                    if (row.get(kind) or '').strip():
+                        inputs[f'{kind}_path'] = os.path.join(base, row[kind].strip())
+                submissions.append({'id': row['id'], 'inputs': inputs})
+    return submissions
+
+
+def _record(item, submission_id, check):
+    # Missing BOM cells come through as float NaN, which is not valid JSON
+    record = {key: None if isinstance(value, float) and value != value else value for key, value in item.items()}
+    return dict(record, Submission=submission_id, Check=check)
+
+
+def finding_records(submission_id, results):
+    """One JSON record per finding, cross-validations first, tagged with submission and check."""
+    for item in results.get('internal_sim', []):
+        yield _record(item, submission_id, 'internal_sim')
+    for check in ('bom', 'image', 'doc'):
+        for items in results.get(check, {}).values():
+            for item in items:
+                yield _record(item, submission_id, check)
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, 'r', encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def warm_indexes(screening_app):
+    """Brings the on-disk indexes up to date once, before the workers load them read-only."""
+    screening_app.image_index.refresh(force=True)
+    screening_app.export_master.get()
+    from src.document_similarity import get_document_index
+    from src.semantic_index import get_semantic_index
+    get_index = get_semantic_index if screening_app.app.config['DOC_SEARCH_MODE'] == 'semantic' else get_document_index
+    try:
+        get_index(screening_app.PRODUCT_DESCRIPTIONS_PATH)
+    except (FileNotFoundError, ValueError, ImportError) as e:
+        print(f"Document index not available: {e}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen BOMs, product images and documents in bulk.")
+    parser.add_argument('--bom-dir')
+    parser.add_argument('--image-dir')
+    parser.add_argument('--doc-dir')
+    parser.add_argument('--manifest', help="CSV with id, bom, image, doc and brand_folder columns")
+    parser.add_argument('--brand-folder', default='all')
+    parser.add_argument('--output', required=True)
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default=None,
+                        help="defaults to the output file extension")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--checkpoint', help="defaults to <output>.done")
+    args = parser.parse_args(argv)
+
+    output_format = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    checkpoint_path = args.checkpoint or args.output + '.done'
+    done = load_checkpoint(checkpoint_path)
+    submissions = [s for s in collect_submissions(args) if s['id'] not in done]
+    print(f"{len(done)} submissions already screened, {len(submissions)} to go.")
+    if not submissions:
+        return 0
+
+    import app as screening_app
+    warm_indexes(screening_app)
+
+    from src.excel_report import report_rows
+    new_output = not os.path.exists(args.output) or os.path.getsize(args.output) == 0
+    failures = 0
+    with open(args.output, 'a', newline='', encoding='utf-8') as out, \
+            open(checkpoint_path, 'a', encoding='utf-8') as checkpoint, \
+            ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('spawn'),
+                                initializer=_init_worker) as pool:
+        writer = csv.writer(out) if output_format == 'csv' else None
+        if writer and new_output:
+            writer.writerow(CSV_COLUMNS)
+        futures = [pool.submit(screen_submission, submission) for submission in submissions]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Screening"):
+            submission_id, results, error = future.result()
+            if error:
+                failures += 1
+                print(f"[ERROR] {submission_id}: {error}")
+                continue
+            if writer:
+                for row, _ in report_rows(results):
+                    writer.writerow([submission_id] + row)
+            else:
+                for record in finding_records(submission_id, results):
+                    out.write(json.dumps(record, default=str, ensure_ascii=False, allow_nan=False) + '\n')
+            # Findings are on disk before the submission is marked done
+            out.flush()
+            checkpoint.write(submission_id + '\n')
+            checkpoint.flush()
+    print(f"Done: {len(submissions) - failures} screened, {failures} failed. Findings in {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
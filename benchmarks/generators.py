@@ -0,0 +1,122 @@
+"""Synthetic, seeded inputs for the benchmarks: export masters, BOMs, image catalogs, corpora, results."""
+import os
+import cv2
+import numpy as np
+import pandas as pd
+
+CATEGORIES = [
+    "Electric Motor", "Gearbox", "Pump", "Valve", "Air Compressor", "Heat Exchanger", "Ball Bearing",
+    "Inverter Drive", "Power Transformer", "PLC Controller", "Servo Motor", "Pneumatic Cylinder",
+    "Solenoid Valve", "Rotary Encoder", "Proximity Sensor", "Load Cell", "Flow Meter", "Industrial Robot",
+    "Circuit Breaker", "Terminal Block", "Cooling Tower", "Industrial Chiller", "Boiler", "Conveyor Belt",
+]
+HS_CODES = ["8501.0", "8483.0", "8413.0", "8481.0", "8414.0", "8419.0", "8482.0", "8504.0", "8537.0", "8402.0"]
+WORDS = ("heavy duty industrial electric compact steel stainless high pressure torque speed motor gear pump "
+         "valve sensor controller drive bearing housing shaft flange coupling cooling thermal hydraulic "
+         "pneumatic precision automatic digital analog module panel unit assembly frame seal").split()
+FEATURES = ["Quantity", "Net Weight (kg)", "Total Value (USD)"]
+
+
+def _sentence(rng, n_words):
+    return " ".join(rng.choice(WORDS, n_words))
+
+
+def _features(rng, n):
+    quantity = rng.lognormal(3, 0.5, n)
+    weight = quantity * rng.normal(2.5, 0.3, n)
+    value = weight * rng.normal(1.2, 0.1, n)
+    return {"Quantity": quantity, "Net Weight (kg)": weight, "Total Value (USD)": value}
+
+
+def make_export_master(n_rows, seed=0):
+    """Export master with Category, HS Code, Product Description and the three market features."""
+    rng = np.random.default_rng(seed)
+    categories = rng.choice(CATEGORIES, n_rows)
+    return pd.DataFrame(dict({
+        "Category": categories,
+        "HS Code": rng.choice(HS_CODES, n_rows),
+        "Product Description": [f"{_sentence(rng, 4)} {category.lower()} {_sentence(rng, 3)}"
+                                for category in categories],
+    }, **_features(rng, n_rows)))
+
+
+def make_bom(n_rows, seed=1, outlier_share=0.02):
+    """BOM rows mixing known and unknown categories/HS codes, with a share of anomalous quantities."""
+    rng = np.random.default_rng(seed)
+    categories = np.where(rng.random(n_rows) < 0.7, rng.choice(CATEGORIES, n_rows),
+                          [f"Part {i}" for i in rng.integers(0, 10 ** 6, n_rows)])
+    hs_codes = np.where(rng.random(n_rows) < 0.6, rng.choice(HS_CODES, n_rows),
+                        [f"{code}.0" for code in rng.integers(1000, 9999, n_rows)])
+    features = _features(rng, n_rows)
+    outliers = rng.random(n_rows) < outlier_share
+    features["Quantity"] = np.where(outliers, features["Quantity"] * 1000, features["Quantity"])
+    return pd.DataFrame(dict({
+        "Category": categories,
+        "HS Code": hs_codes,
+        "Company": rng.choice(["Acme", "Globex", "Initech", "Umbrella"], n_rows),
+        "Product": [f"Product {i}" for i in range(n_rows)],
+    }, **features))
+
+
+def make_image(rng, size=(160, 120)):
+    """A random image with a coloured block layout, so histograms and SSIM are not trivial."""
+    width, height = size
+    img = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for _ in range(4):
+        x, y = rng.integers(0, width // 2), rng.integers(0, height // 2)
+        img[y:y + height // 2, x:x + width // 2] = rng.integers(0, 255, 3)
+    return img
+
+
+def make_image_catalog(folder, n_brands, n_images, seed=2):
+    """Writes n_brands x n_images JPEGs as <folder>/Brand i/Co<j>_Brand_<i>.jpg and returns their paths."""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for brand in range(n_brands):
+        brand_folder = os.path.join(folder, f"Brand {brand}")
+        os.makedirs(brand_folder, exist_ok=True)
+        for image in range(n_images):
+            path = os.path.join(brand_folder, f"Co{image}_Brand_{brand}.jpg")
+            cv2.imwrite(path, make_image(rng))
+            paths.append(path)
+    return paths
+
+
+def make_description_corpus(n_rows, seed=3):
+    """Product / Description corpus in the format of product_descriptions.csv."""
+    rng = np.random.default_rng(seed)
+    products = rng.choice(CATEGORIES, n_rows)
+    return pd.DataFrame({
+        "Product": products,
+        "Description": [f"{product} {_sentence(rng, int(rng.integers(15, 40)))}" for product in products],
+    })
+
+
+def make_document(n_words, seed=4):
+    rng = np.random.default_rng(seed)
+    return _sentence(rng, n_words)
+
+
+def make_results(n_bom, n_image, n_doc, seed=5):
+    """An all_results dict as produced by app.run_analysis(), with high/moderate/low items of each check."""
+    rng = np.random.default_rng(seed)
+    levels = ["High", "Moderate", "Low"]
+
+    def items(n, make):
+        buckets = {'high': [], 'moderate': [], 'low': []}
+        for i, level in enumerate(rng.choice(levels, n, p=[0.4, 0.3, 0.3])):
+            buckets[level.lower()].append(make(i, level))
+        return buckets
+
+    bom = items(n_bom, lambda i, level: {
+        "Category": str(rng.choice(CATEGORIES)), "HS Code": str(rng.choice(HS_CODES)), "Company": "Acme",
+        "Product": f"Product {i}", "Risk Level": level, "Finding": "Category and HS Code both found in export list."})
+    image = items(n_image, lambda i, level: {
+        "Uploaded Image": f"upload {i}", "Brand Image": f"Co{i}_Brand.jpg", "Risk Level": level,
+        "Category": str(rng.choice(CATEGORIES)), "Company": f"Co{i} Brand",
+        "Finding": f"{level} visual similarity (Correlation: 0.90, SSIM: 0.70)"})
+    doc = items(n_doc, lambda i, level: {
+        "Uploaded Document": "upload", "Brand Document": f"Row {i}", "Similarity Score": 0.6,
+        "Risk Level": level, "Category": str(rng.choice(CATEGORIES)), "Snippet": _sentence(rng, 20),
+        "Finding": f"{level} textual similarity"})
+    return {'bom': bom, 'image': image, 'doc': doc, 'internal_sim': []}
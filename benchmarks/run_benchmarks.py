@@ -0,0 +1,227 @@
+"""
+Offline benchmarks for every analysis stage of /submit_all, on synthetic data.
+
+    python benchmarks/run_benchmarks.py --scales small,medium --output benchmarks/results.json
+    python benchmarks/run_benchmarks.py --scales small --baseline benchmarks/results.json
+
+Every (stage, scale) is timed `--repeat` times, then run once more under tracemalloc for
+its peak Python/NumPy allocation. Results are written as JSON together with the git
+revision, so two runs can be compared with --baseline. Work done in pool worker
+processes (parallel image decoding) is timed but not part of the memory peak.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.append(PROJECT_ROOT)
+sys.path.append(BENCH_DIR)
+
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+
+import generators
+from src.bom_screening import ExportIndex, screen_bom
+from src.image_index import ImageFeatureIndex, histogram_from_image, grayscale_thumbnail, score_histograms, \
+    ssim_shortlist
+from src.document_similarity import DocumentIndex, get_top_similar_docs_for_file
+from src.anomaly_detector import fit_market_model, is_anomalous, score_batch, FEATURES
+from src.consolidation import consolidate
+from src.excel_report import write_report
+
+SCALES = {
+    'small': {'export_rows': 2000, 'bom_rows': 500, 'brands': 3, 'images_per_brand': 10, 'corpus_rows': 1000,
+              'doc_words': 500, 'anomaly_points': 50, 'result_items': 300},
+    'medium': {'export_rows': 20000, 'bom_rows': 5000, 'brands': 6, 'images_per_brand': 40, 'corpus_rows': 10000,
+               'doc_words': 5000, 'anomaly_points': 200, 'result_items': 3000},
+    'large': {'export_rows': 100000, 'bom_rows': 20000, 'brands': 10, 'images_per_brand': 100,
+              'corpus_rows': 50000, 'doc_words': 50000, 'anomaly_points': 500, 'result_items': 20000},
+}
+SSIM_SHORTLIST = 25
+
+
+def _fresh_dir(workdir, name):
+    path = os.path.join(workdir, name)
+    shutil.rmtree(path, ignore_errors=True)
+    return path
+
+
+# Each stage: setup(params, workdir) -> state, run(state). Only run() is measured.
+
+def setup_bom(params, workdir):
+    export_df = generators.make_export_master(params['export_rows'])
+    return {'export': export_df, 'bom': generators.make_bom(params['bom_rows']), 'index': ExportIndex(export_df)}
+
+
+def setup_image_catalog(params, workdir):
+    catalog = os.path.join(workdir, 'catalog')
+    if not os.path.isdir(catalog):
+        generators.make_image_catalog(catalog, params['brands'], params['images_per_brand'])
+    return {'catalog': catalog, 'workdir': workdir}
+
+
+def run_image_index_build(state):
+    ImageFeatureIndex(state['catalog'], _fresh_dir(state['workdir'], 'image_index')).refresh(force=True)
+
+
+def setup_image_matching(params, workdir):
+    state = setup_image_catalog(params, workdir)
+    index = ImageFeatureIndex(state['catalog'], _fresh_dir(workdir, 'image_index_query'))
+    index.refresh(force=True)
+    query = generators.make_image(np.random.default_rng(99))
+    state.update(snapshot=index.snapshot(), hist=histogram_from_image(query), gray=grayscale_thumbnail(query))
+    return state
+
+
+def run_image_matching(state):
+    """The index path of the app's image check: histogram correlation, then SSIM on the shortlist."""
+    snapshot = state['snapshot']
+    result = score_histograms(state['hist'], snapshot['unit_histograms'], top_k=SSIM_SHORTLIST)
+    for position in ssim_shortlist(result, SSIM_SHORTLIST):
+        ssim(state['gray'], np.asarray(snapshot['thumbnails'][position]))
+
+
+def setup_documents(params, workdir):
+    csv_path = os.path.join(workdir, 'descriptions.csv')
+    corpus = generators.make_description_corpus(params['corpus_rows'])
+    corpus.to_csv(csv_path, index=False)
+    doc_path = os.path.join(workdir, 'upload.txt')
+    with open(doc_path, 'w', encoding='utf-8') as f:
+        f.write(generators.make_document(params['doc_words']))
+    return {'corpus': corpus, 'csv': csv_path, 'doc': doc_path, 'workdir': workdir}
+
+
+def run_tfidf_index_build(state):
+    index = DocumentIndex(_fresh_dir(state['workdir'], 'tfidf_index'))
+    index.rebuild(state['corpus']['Product'].tolist(), state['corpus']['Description'].tolist())
+
+
+def setup_tfidf_search(params, workdir):
+    state = setup_documents(params, workdir)
+    get_top_similar_docs_for_file(state['doc'], state['csv'], 5)
+    return state
+
+
+def setup_anomaly(params, workdir):
+    market = generators.make_export_master(params['export_rows'])
+    bom = generators.make_bom(params['bom_rows'])
+    points = bom[FEATURES].to_numpy()
+    fit_market_model(market)
+    is_anomalous(market, points[0])
+    return {'market': market, 'points': points, 'n_points': params['anomaly_points']}
+
+
+def run_is_anomalous(state):
+    for point in state['points'][:state['n_points']]:
+        is_anomalous(state['market'], point)
+
+
+def setup_results(params, workdir):
+    n = params['result_items']
+    return {'results': generators.make_results(n, n // 10, n // 10), 'path': os.path.join(workdir, 'report.xlsx')}
+
+
+def _copy_results(results):
+    return {key: list(value) if isinstance(value, list) else {level: list(items) for level, items in value.items()}
+            for key, value in results.items()}
+
+
+STAGES = {
+    'export_index': (lambda p, w: setup_bom(p, w), lambda s: ExportIndex(s['export'])),
+    'bom_screening': (setup_bom, lambda s: screen_bom(s['bom'], s['index'])),
+    'image_index_build': (setup_image_catalog, run_image_index_build),
+    'image_matching': (setup_image_matching, run_image_matching),
+    'tfidf_index_build': (setup_documents, run_tfidf_index_build),
+    'tfidf_search': (setup_tfidf_search, lambda s: get_top_similar_docs_for_file(s['doc'], s['csv'], 5)),
+    'anomaly_fit': (setup_anomaly, lambda s: fit_market_model(s['market'])),
+    'is_anomalous': (setup_anomaly, run_is_anomalous),
+    'anomaly_score_batch': (setup_anomaly, lambda s: score_batch(s['market'], s['points'])),
+    'consolidation': (setup_results, lambda s: consolidate(_copy_results(s['results']))),
+    'generate_report': (setup_results, lambda s: write_report(s['results'], s['path'])),
+}
+
+
+def measure(run, state, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run(state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'times_s': [round(t, 6) for t in times], 'median_s': round(statistics.median(times), 6),
+            'min_s': round(min(times), 6), 'peak_memory_bytes': peak}
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {(r['stage'], r['scale']): r for r in json.load(f)['results']}
+    print(f"{'stage':<22}{'scale':<8}{'median s':>12}{'baseline s':>12}{'ratio':>8}{'peak MB':>10}")
+    for r in results:
+        old = baseline.get((r['stage'], r['scale']))
+        old_median = old['median_s'] if old else None
+        ratio = f"{r['median_s'] / old_median:.2f}" if old_median else '-'
+        print(f"{r['stage']:<22}{r['scale']:<8}{r['median_s']:>12.4f}{old_median or float('nan'):>12.4f}"
+              f"{ratio:>8}{r['peak_memory_bytes'] / 2 ** 20:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis stages on synthetic data.")
+    parser.add_argument('--scales', default='small', help=f"comma-separated, from {', '.join(SCALES)}")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated stage names")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="JSON results file (printed to stdout when omitted)")
+    parser.add_argument('--baseline', help="earlier JSON results to compare with")
+    args = parser.parse_args(argv)
+
+    results = []
+    for scale in args.scales.split(','):
+        params = SCALES[scale]
+        workdir = tempfile.mkdtemp(prefix=f'ip_bench_{scale}_')
+        try:
+            for stage in args.stages.split(','):
+                setup, run = STAGES[stage]
+                state = setup(params, workdir)
+                result = dict(stage=stage, scale=scale, params=params, repeat=args.repeat,
+                              **measure(run, state, args.repeat))
+                print(f"{stage:<22}{scale:<8}{result['median_s']:>10.4f} s{result['peak_memory_bytes'] / 2 ** 20:>9.1f} MB",
+                      file=sys.stderr)
+                results.append(result)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {'revision': git_revision(), 'python': platform.python_version(), 'platform': platform.platform(),
+              'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,28 +1,213 @@
 from sklearn.ensemble import IsolationForest
 import pandas as pd
 import numpy as np
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-def is_anomalous(market_df, test_point, contamination=0.05):
-    features = ["Quantity", "Net Weight (kg)", "Total Value (USD)"]
-    market_df = market_df.dropna(subset=features)
+from src import metrics
+
+FEATURES = ["Quantity", "Net Weight (kg)", "Total Value (USD)"]
+MAX_CACHED_MODELS = 256
+MIN_SEGMENT_ROWS = 10
+
+_models = OrderedDict()
+_models_lock = threading.Lock()
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def market_key(market_df, contamination=0.05):
+    """Content hash of the market feature rows, used to recognise the same dataset version."""
+    features = market_df[FEATURES].dropna()
+    row_hashes = pd.util.hash_pandas_object(features, index=False).to_numpy()
+    return f"{contamination}:{len(features)}:{row_hashes.sum(dtype='uint64')}:{np.bitwise_xor.reduce(row_hashes)}"
+
+
+def fit_market_model(market_df, contamination=0.05):
+    """
+    Fits an IsolationForest on the market data and records the min/max of its decision
+    function over that data. Returns None when there are fewer than 10 usable rows.
+    """
+    market_df = market_df.dropna(subset=FEATURES)
 
     if len(market_df) < 10:
-        return None, None
+        return None
 
     model = IsolationForest(contamination=contamination, random_state=42)
-    model.fit(market_df[features])
+    model.fit(market_df[FEATURES])
+    scores = model.decision_function(market_df[FEATURES])
+    return {'model': model, 'min_score': float(scores.min()), 'max_score': float(scores.max())}
+
+
+def _cached_model(key):
+    with _models_lock:
+        if key in _models:
+            _models.move_to_end(key)
+            metrics.inc('cache_requests_total', cache='anomaly_model', result='hit')
+            return True, _models[key]
+    metrics.inc('cache_requests_total', cache='anomaly_model', result='miss')
+    return False, None
+
+
+def _cache_model(key, fitted):
+    with _models_lock:
+        _models[key] = fitted
+        while len(_models) > MAX_CACHED_MODELS:
+            _models.popitem(last=False)
+
+
+def get_market_model(market_df, contamination=0.05):
+    """Cached fit_market_model(): each market dataset version is fitted once per process."""
+    key = market_key(market_df, contamination)
+    found, fitted = _cached_model(key)
+    if not found:
+        fitted = fit_market_model(market_df, contamination)
+        _cache_model(key, fitted)
+    return fitted
+
+
+def _get_pool(max_workers=None):
+    """
+    The shared model-fitting pool, sized `max_workers` (one per core when None). A call
+    with another size replaces it; work already submitted to the old pool still completes.
+    Workers are spawned, so the caller's threads and locks are not forked into them.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != max_workers:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = max_workers
+        return _pool
+
+
+def shutdown_pool():
+    """Stops the model-fitting worker processes, if they were started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def get_market_models(segments, contamination=0.05, max_workers=None):
+    """
+    get_market_model() for several market segments at once ({label: market_df}).
+    Segments without a cached model are fitted in parallel on a process pool
+    (in-process when max_workers is 1).
+    """
+    keys = {label: market_key(df, contamination) for label, df in segments.items()}
+    fitted, missing = {}, []
+    for label, key in keys.items():
+        found, model = _cached_model(key)
+        if found:
+            fitted[label] = model
+        else:
+            missing.append(label)
+    if len(missing) == 1 or max_workers == 1:
+        for label in missing:
+            fitted[label] = fit_market_model(segments[label], contamination)
+    elif missing:
+        pool = _get_pool(max_workers)
+        futures = {label: pool.submit(fit_market_model, segments[label], contamination) for label in missing}
+        for label, future in futures.items():
+            fitted[label] = future.result()
+    for label in missing:
+        _cache_model(keys[label], fitted[label])
+    return fitted
+
+
+def score_points(fitted, points):
+    """Anomaly flags and 0-100 risk scores for an (n, 3) matrix of feature rows, in one call."""
+    points = pd.DataFrame(np.asarray(points, dtype=float).reshape(-1, len(FEATURES)), columns=FEATURES)
+    model = fitted['model']
+
+    # Prediction, -1 = anomaly; decision_function is negative for anomalies, so reuse it
+    score_raw = model.decision_function(points)
+    anomaly = score_raw < 0
+
+    # Normalize to 0–100 risk score (lower scores → higher risk); points outside the
+    # range seen on the market data are clipped to it
+    min_score, max_score = fitted['min_score'], fitted['max_score']
+    risk_score = 100 * (1 - (score_raw - min_score) / ((max_score - min_score) or 1.0))
+    return anomaly, np.round(np.clip(risk_score, 0, 100), 2)
+
+
+def score_batch(market_df, points, contamination=0.05):
+    """
+    Batch form of is_anomalous: scores every row of `points` (e.g. a whole BOM's
+    Quantity / Net Weight / Total Value matrix) against one cached model.
+    Returns (None, None) when the market data is too small to model.
+    """
+    fitted = get_market_model(market_df, contamination)
+    if fitted is None:
+        return None, None
+    return score_points(fitted, points)
+
+
+def is_anomalous(market_df, test_point, contamination=0.05):
+    anomaly, risk_score = score_batch(market_df, [test_point], contamination)
+    if anomaly is None:
+        return None, None
+    return bool(anomaly[0]), float(risk_score[0])
+
+
+def _segment_labels(df, column):
+    """Segment label of each row; missing and blank values stay NaN, so those rows fall through to the next column."""
+    values = df[column]
+    # Converted only where present: on pandas < 3, astype(str) turns NaN into the label 'nan'
+    labels = values[values.notna()].astype(str).str.strip()
+    labels = labels.str.lower() if column == 'Category' else labels
+    return labels[labels != ''].reindex(df.index)
+
 
-    # Prediction
-    prediction = model.predict([test_point])[0]  # -1 = anomaly
-    anomaly = prediction == -1
+def score_segments(market_df, bom_df, segment_columns=('HS Code', 'Category'), contamination=0.05,
+                   max_workers=None):
+    """
+    Scores every BOM row against the part of the market that shares its segment: the
+    first of `segment_columns` whose value has at least MIN_SEGMENT_ROWS market rows,
+    or the whole market otherwise. Returns one dict per scored BOM row with its
+    position, the segment used, the anomaly flag and the 0-100 risk score.
+    """
+    if any(feature not in market_df.columns or feature not in bom_df.columns for feature in FEATURES):
+        return []
+    market_df = market_df.assign(**{feature: pd.to_numeric(market_df[feature], errors='coerce')
+                                    for feature in FEATURES}).dropna(subset=FEATURES)
+    bom_features = bom_df[FEATURES].apply(pd.to_numeric, errors='coerce')
+    positions = np.flatnonzero(bom_features.notna().all(axis=1).to_numpy())
+    if not len(positions) or len(market_df) < MIN_SEGMENT_ROWS:
+        return []
 
-    # Score (more negative = more anomalous)
-    score_raw = model.decision_function([test_point])[0]
+    assigned = pd.Series('All', index=positions, dtype=object)
+    segments = {'All': market_df}
+    pending = positions
+    for column in segment_columns:
+        if column not in market_df.columns or column not in bom_df.columns or not len(pending):
+            continue
+        market_labels = _segment_labels(market_df, column)
+        sizes = market_labels.value_counts()
+        bom_labels = _segment_labels(bom_df, column).to_numpy()[pending]
+        usable = pd.Series(bom_labels).isin(sizes.index[sizes >= MIN_SEGMENT_ROWS]).to_numpy()
+        for label in set(bom_labels[usable].tolist()):
+            segments[f"{column} {label}"] = market_df[market_labels == label]
+        assigned[pending[usable]] = [f"{column} {label}" for label in bom_labels[usable]]
+        pending = pending[~usable]
 
-    # Normalize to 0–100 risk score (lower scores → higher risk)
-    min_score = model.decision_function(market_df[features]).min()
-    max_score = model.decision_function(market_df[features]).max()
-    risk_score = 100 * (1 - (score_raw - min_score) / (max_score - min_score))
-    risk_score = round(risk_score, 2)
+    needed = {label: segments[label] for label in set(assigned.tolist())}
+    models = get_market_models(needed, contamination, max_workers)
 
-    return anomaly, risk_score
+    results = []
+    for label, rows in assigned.groupby(assigned).groups.items():
+        if models.get(label) is None:
+            continue
+        rows = np.asarray(rows)
+        anomaly, risk_score = score_points(models[label], bom_features.to_numpy()[rows])
+        for row, flag, risk in zip(rows.tolist(), anomaly.tolist(), risk_score.tolist()):
+            results.append({'row': row, 'segment': label, 'anomaly': flag, 'risk_score': risk})
+    results.sort(key=lambda result: result['row'])
+    return results
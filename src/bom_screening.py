@@ -0,0 +1,98 @@
+import pandas as pd
+
+from src.text_index import AhoCorasick
+
+EXACT_FINDING = "Category and HS Code both found in export list."
+PARTIAL_FINDING = "Either Category or HS Code matches, but not both."
+DESCRIPTION_FINDING = "Partial description similarity found in export list."
+NO_MATCH_FINDING = "No strong match, only weak/description similarity."
+
+
+def _column(df, name, default=''):
+    if name in df.columns:
+        return df[name]
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def normalize_categories(series):
+    """Stripped, lower-cased categories; missing values stay missing so they never match."""
+    return series.astype('string').str.strip().str.lower()
+
+
+def normalize_hs_codes(series):
+    return series.astype(str).str.strip()
+
+
+def _as_text(series):
+    """str() of every value, the way a single BOM row is read (missing values become 'nan')."""
+    return series.map(str).astype(object)
+
+
+class ExportIndex:
+    """
+    Hash indexes over the master export list, built once from its normalised columns:
+    (category, HS code) pairs, HS codes and categories, plus the lower-cased
+    product descriptions used by the low-risk fallback.
+    """
+
+    def __init__(self, export_df):
+        categories = normalize_categories(_column(export_df, 'Category', None))
+        hs_codes = normalize_hs_codes(_column(export_df, 'HS Code', None))
+        known = categories.notna()
+        self.pairs = pd.MultiIndex.from_arrays([categories[known].astype(object), hs_codes[known]]).unique()
+        self.hs_codes = pd.Index(hs_codes.unique())
+        self.categories = pd.Index(categories[known].unique().astype(object))
+        self.descriptions = _column(export_df, 'Product Description', None).dropna().astype(str).tolist()
+        self.lowered_descriptions = [desc.lower() for desc in self.descriptions]
+
+    def match_descriptions(self, categories):
+        """
+        {category: first export description containing it (case-insensitive)} for every
+        category that occurs in some description, found in one pass over the descriptions.
+        """
+        needles = {category: category.lower() for category in categories}
+        first = AhoCorasick(needles.values()).first_matches(self.lowered_descriptions)
+        return {category: self.descriptions[first[needle]] for category, needle in needles.items() if needle in first}
+
+
+def screen_bom(bom_df, export_index):
+    """
+    Classifies every BOM row against the export list in one pass.
+
+    High: category and HS code appear together. Moderate: only one of them appears.
+    Low: neither, split by whether the category occurs in an export description (the
+    first such description is returned as 'Matched Description').
+    Returns {'high': [...], 'moderate': [...], 'low': [...]} with rows in BOM order.
+    """
+    results = {'high': [], 'moderate': [], 'low': []}
+    if bom_df.empty:
+        return results
+
+    categories = _as_text(_column(bom_df, 'Category')).str.strip()
+    hs_codes = _as_text(_column(bom_df, 'HS Code')).str.strip()
+    lowered = categories.str.lower()
+
+    exact = pd.MultiIndex.from_arrays([lowered, hs_codes]).isin(export_index.pairs)
+    partial = hs_codes.isin(export_index.hs_codes).to_numpy() | lowered.isin(export_index.categories).to_numpy()
+
+    unmatched = categories[~(exact | partial)].unique().tolist()
+    described = export_index.match_descriptions(unmatched) if unmatched else {}
+
+    companies = _column(bom_df, 'Company', 'N/A').tolist()
+    products = _column(bom_df, 'Product', 'N/A').tolist()
+    for i, (category, hs_code) in enumerate(zip(categories.tolist(), hs_codes.tolist())):
+        row_data = {"Category": category, "HS Code": hs_code, "Company": companies[i], "Product": products[i]}
+        if exact[i]:
+            row_data.update({"Risk Level": "High", "Finding": EXACT_FINDING})
+            results['high'].append(row_data)
+        elif partial[i]:
+            row_data.update({"Risk Level": "Moderate", "Finding": PARTIAL_FINDING})
+            results['moderate'].append(row_data)
+        elif category in described:
+            row_data.update({"Risk Level": "Low", "Finding": DESCRIPTION_FINDING,
+                             "Matched Description": described[category]})
+            results['low'].append(row_data)
+        else:
+            row_data.update({"Risk Level": "Low", "Finding": NO_MATCH_FINDING})
+            results['low'].append(row_data)
+    return results
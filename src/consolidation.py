@@ -0,0 +1,92 @@
+import re
+
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def category_tokens(item):
+    """Lower-cased word tokens of an item's 'Category'."""
+    return set(_NON_WORD.sub(' ', item.get('Category') or '').lower().split())
+
+
+class TokenIndex:
+    """Inverted token -> first position index over the category tokens of a list of items."""
+
+    def __init__(self, items, tokens):
+        self.items = items
+        self.first = {}
+        for position, item in enumerate(items):
+            for token in tokens[id(item)]:
+                self.first.setdefault(token, position)
+
+    def first_match(self, item_tokens):
+        """The earliest item sharing at least one token with `item_tokens`, or None."""
+        positions = [self.first[token] for token in item_tokens if token in self.first]
+        return self.items[min(positions)] if positions else None
+
+
+def cross_validate(items, counterparts, tokens):
+    """
+    (item, counterpart) pairs where each item is matched with the first counterpart whose
+    category shares a token with its own. A counterpart can confirm several items.
+    """
+    index = TokenIndex(counterparts, tokens)
+    pairs = []
+    for item in items:
+        counterpart = index.first_match(tokens[id(item)])
+        if counterpart is not None:
+            pairs.append((item, counterpart))
+    return pairs
+
+
+def consolidate(all_results):
+    """
+    Cross-validates the high-risk items of the BOM, image and document checks: every
+    confirmed pair is added to 'internal_sim' and both items leave their standalone lists.
+    """
+    bom_items = all_results['bom']['high']
+    image_items = all_results['image']['high']
+    doc_items = all_results['doc']['high']
+    tokens = {id(item): category_tokens(item) for item in bom_items + image_items + doc_items}
+    confirmed = set()
+
+    # 🔹 BOM ↔ Image cross validation
+    for bom_item, image_item in cross_validate(bom_items, image_items, tokens):
+        all_results['internal_sim'].append({
+            "Type": "BOM-Image Cross-Validation",
+            "Risk Level": "High",
+            "Product": bom_item.get('Product'),
+            "Category": bom_item.get('Category'),
+            "Company": bom_item.get('Company'),
+            "Finding": f"BOM high-risk item confirmed by Image (match: {image_item.get('Brand Image')})."
+        })
+        confirmed.update((id(bom_item), id(image_item)))
+
+    # 🔹 BOM ↔ Document cross validation
+    for bom_item, doc_item in cross_validate(bom_items, doc_items, tokens):
+        all_results['internal_sim'].append({
+            "Type": "BOM-Document Cross-Validation",
+            "Risk Level": "High",
+            "Product": bom_item.get('Product'),
+            "Category": bom_item.get('Category'),
+            "Company": bom_item.get('Company'),
+            "Finding": f"BOM high-risk item confirmed by Document (doc: {doc_item.get('Finding')})."
+        })
+        confirmed.update((id(bom_item), id(doc_item)))
+
+    # 🔹 Image ↔ Document cross validation
+    for image_item, doc_item in cross_validate(image_items, doc_items, tokens):
+        all_results['internal_sim'].append({
+            "Type": "Image-Document Cross-Validation",
+            "Risk Level": "High",
+            "Product": image_item.get('Uploaded Image'),
+            "Category": image_item.get('Category'),
+            "Company": image_item.get('Company'),
+            "Finding": f"Image high-risk item confirmed by Document (doc: {doc_item.get('Finding')})."
+        })
+        confirmed.update((id(image_item), id(doc_item)))
+
+    # Remove confirmed items from standalone lists
+    all_results['bom']['high'] = [i for i in bom_items if id(i) not in confirmed]
+    all_results['image']['high'] = [i for i in image_items if id(i) not in confirmed]
+    all_results['doc']['high'] = [i for i in doc_items if id(i) not in confirmed]
+    return all_results
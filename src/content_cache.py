@@ -0,0 +1,112 @@
+import os
+import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+from src import metrics
+
+CHUNK_SIZE = 1024 * 1024
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS check_results (
+    key TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_stream(stream, folder, extension=''):
+    """
+    Copies a binary stream into `folder` under its SHA-256 digest, hashing while it is
+    written. Returns (path, digest); content that is already stored is not kept twice.
+    """
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        path = os.path.join(folder, digest.hexdigest() + extension.lower())
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            metrics.inc('uploads_total', result='duplicate')
+        else:
+            os.replace(tmp_path, path)
+            metrics.inc('uploads_total', result='new')
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path, digest.hexdigest()
+
+
+def cache_key(*parts):
+    """A stable key for JSON-serialisable parts (check name, input digest, reference version, settings)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+class CheckCache:
+    """
+    Memoized check results in a SQLite table, bounded in size.
+
+    Results are saved as zlib-compressed JSON under a key built by cache_key(). get()
+    marks an entry as used; put() evicts the least recently used entries once the
+    stored results exceed `max_bytes`.
+    """
+
+    def __init__(self, db_path, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS check_results_last_used ON check_results (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def get(self, key):
+        """The results saved under `key`, or None."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM check_results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE check_results SET last_used = ? WHERE key = ?", (time.time(), key))
+        metrics.inc('cache_requests_total', cache='check_results', result='miss' if row is None else 'hit')
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key, results):
+        data = zlib.compress(json.dumps(results, default=str).encode('utf-8'))
+        if len(data) > self.max_bytes:
+            return
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO check_results (key, data, size, last_used) VALUES (?, ?, ?, ?)",
+                         (key, data, len(data), time.time()))
+            excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM check_results").fetchone()[0] - self.max_bytes
+            if excess <= 0:
+                return
+            evicted = []
+            for old_key, size in conn.execute("SELECT key, size FROM check_results ORDER BY last_used"):
+                if excess <= 0:
+                    break
+                evicted.append((old_key,))
+                excess -= size
+            conn.executemany("DELETE FROM check_results WHERE key = ?", evicted)
@@ -1,8 +1,13 @@
-import requests
 import csv
-import time
 import os
-from itertools import cycle
+import re
+import sys
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Runnable as `python src/document.py` as well as `python -m src.document`
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.scraping import make_session, KeyRateLimiter, Checkpoint
 
 # SerpAPI keys
 SERP_API_KEYS = [
@@ -15,23 +20,35 @@ SERP_API_KEYS = [
 # Constants
 MAX_DESCRIPTIONS = 20
 MIN_DESCRIPTIONS = 5
-WAIT_BETWEEN_REQUESTS = 2
+WAIT_BETWEEN_REQUESTS = 2  # seconds between two searches with the same key
 RETRIES = 4
-OUTPUT_CSV = "product_descriptions.csv"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_CSV = os.path.join(BASE_DIR, "product_descriptions.csv")
+PRODUCT_LIST = os.path.join(BASE_DIR, "product_list.txt")
+CHECKPOINT_FILE = os.path.join(BASE_DIR, "completed_products.json")
+SEARCH_URL = os.environ.get("SERPAPI_URL", "https://serpapi.com/search.json")
+MAX_WORKERS = 8
+# Rows buffered before they are appended to the CSV (and their products checkpointed)
+BATCH_SIZE = 200
+NO_DESCRIPTION = "No description found"
 
-def load_products(file_path="product_list.txt"):
+def load_products(file_path=PRODUCT_LIST):
     with open(file_path, "r", encoding="utf-8") as f:
         return [line.strip() for line in f if line.strip()]
 
-def fetch_descriptions(product, api_key):
-    url = "https://serpapi.com/search.json"
+def description_key(product, description):
+    """Hash of a description after lower-casing and collapsing punctuation/whitespace, per product."""
+    normalized = " ".join(re.sub(r"[\W_]+", " ", description.lower()).split())
+    return hashlib.sha1(f"{product}\n{normalized}".encode("utf-8")).hexdigest()
+
+def fetch_descriptions(product, api_key, session=None, search_url=SEARCH_URL):
     params = {
         "q": product,
         "engine": "google",
         "api_key": api_key
     }
     try:
-        response = requests.get(url, params=params, timeout=20)
+        response = (session or make_session()).get(search_url, params=params, timeout=20)
         response.raise_for_status()
         data = response.json()
         descriptions = []
@@ -44,51 +61,97 @@ def fetch_descriptions(product, api_key):
             snippet = result.get("snippet", "")
             if snippet:
                 descriptions.append(snippet.strip())
-        return list(set(descriptions))[:MAX_DESCRIPTIONS]
+        return list(dict.fromkeys(descriptions))[:MAX_DESCRIPTIONS]
 
     except Exception as e:
         print(f"  ❌ Error for {product} with key {api_key[:6]}...: {e}")
         return []
 
-def save_to_csv(data, filename):
-    file_exists = os.path.isfile(filename)
-    with open(filename, "a", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        if not file_exists:
-            writer.writerow(["Product", "Description"])
-        for product, descriptions in data.items():
-            for desc in descriptions:
-                writer.writerow([product, desc])
-
-def main():
-    products = load_products("product_list.txt")
-    key_pool = cycle(SERP_API_KEYS)
-
-    for i, product in enumerate(products, 1):
-        print(f"\n[{i}/{len(products)}] Processing: {product}")
-        all_descs = []
-
-        for attempt in range(RETRIES):
-            api_key = next(key_pool)
-            new_descs = fetch_descriptions(product, api_key)
-            all_descs.extend(new_descs)
-            all_descs = list(set(all_descs))  # deduplicate
-            print(f"  🔄 Attempt {attempt+1} - Got {len(all_descs)} so far")
-            if len(all_descs) >= MIN_DESCRIPTIONS:
-                break
-            time.sleep(WAIT_BETWEEN_REQUESTS)
-
-        if all_descs:
-            to_save = all_descs[:MAX_DESCRIPTIONS]
-            save_to_csv({product: to_save}, OUTPUT_CSV)
-            print(f"  ✅ Saved {len(to_save)} descriptions.")
-        else:
-            print(f"  ⚠ Still 0 descriptions, saving empty entry.")
-            save_to_csv({product: ["No description found"]}, OUTPUT_CSV)
-
-        time.sleep(WAIT_BETWEEN_REQUESTS)
-
-    print("\n✅ Done. Output saved to:", os.path.abspath(OUTPUT_CSV))
+def harvest_product(product, session, limiter, search_url=SEARCH_URL):
+    """Up to MAX_DESCRIPTIONS distinct descriptions of a product, retrying until MIN_DESCRIPTIONS."""
+    found = {}
+    for attempt in range(RETRIES):
+        for desc in fetch_descriptions(product, limiter.acquire(), session, search_url):
+            found.setdefault(description_key(product, desc), desc)
+        if len(found) >= MIN_DESCRIPTIONS:
+            break
+    return list(found.values())[:MAX_DESCRIPTIONS]
+
+class DescriptionWriter:
+    """
+    Buffers (product, description) rows and appends them to the CSV in batches. A product
+    is added to the checkpoint only once its rows are on disk; descriptions already in the
+    CSV (same normalized hash for the same product) are not written again.
+    """
+
+    def __init__(self, filename, checkpoint, batch_size=BATCH_SIZE):
+        self.filename = filename
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.rows = []
+        self.products = []
+        self.seen = set()
+        if os.path.isfile(filename):
+            with open(filename, "r", newline="", encoding="utf-8") as csvfile:
+                for row in csv.DictReader(csvfile):
+                    self.seen.add(description_key(row.get("Product") or "", row.get("Description") or ""))
+
+    def add(self, product, descriptions):
+        for desc in descriptions or [NO_DESCRIPTION]:
+            key = description_key(product, desc)
+            if key not in self.seen:
+                self.seen.add(key)
+                self.rows.append([product, desc])
+        self.products.append(product)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            file_exists = os.path.isfile(self.filename)
+            with open(self.filename, "a", newline="", encoding="utf-8") as csvfile:
+                writer = csv.writer(csvfile)
+                if not file_exists:
+                    writer.writerow(["Product", "Description"])
+                writer.writerows(self.rows)
+        if self.products:
+            products = self.products
+            self.checkpoint.update(lambda completed: completed.extend(products))
+        self.rows, self.products = [], []
+
+def main(product_file=PRODUCT_LIST, output_csv=OUTPUT_CSV, checkpoint_file=CHECKPOINT_FILE,
+         search_url=SEARCH_URL, api_keys=None, max_workers=MAX_WORKERS):
+    """
+    Harvests descriptions for every product not yet in the checkpoint, `max_workers`
+    products at a time over one pooled session; each API key makes at most one request
+    per WAIT_BETWEEN_REQUESTS seconds.
+    """
+    checkpoint = Checkpoint(checkpoint_file, [])
+    completed = set(checkpoint.state)
+    products = [product for product in load_products(product_file) if product not in completed]
+    limiter = KeyRateLimiter(api_keys or SERP_API_KEYS, rate=1.0 / WAIT_BETWEEN_REQUESTS)
+    session = make_session(pool_size=max_workers)
+    writer = DescriptionWriter(output_csv, checkpoint)
+    print(f"{len(completed)} products already done, {len(products)} to harvest.")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(harvest_product, product, session, limiter, search_url): product
+                   for product in products}
+        for i, future in enumerate(as_completed(futures), 1):
+            product = futures[future]
+            try:
+                descriptions = future.result()
+            except Exception as e:
+                print(f"[{i}/{len(products)}] ❌ {product}: {e}")
+                continue
+            writer.add(product, descriptions)
+            if descriptions:
+                print(f"[{i}/{len(products)}] ✅ {product}: {len(descriptions)} descriptions.")
+            else:
+                print(f"[{i}/{len(products)}] ⚠ {product}: 0 descriptions, saving empty entry.")
+    writer.flush()
+
+    print("\n✅ Done. Output saved to:", os.path.abspath(output_csv))
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,25 @@
 import os
+import re
+import json
+import threading
+from collections import Counter
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-def get_top_similar_docs(uploaded_text, csv_path='src/product_descriptions.csv', top_n=10):
+VOCABULARY_FILE = 'vocabulary.json'
+IDF_FILE = 'idf.npy'
+DOCUMENTS_FILE = 'documents.json'
+META_FILE = 'meta.json'
+MATRIX_FILES = ('data', 'indices', 'indptr')
+CHUNK_SIZE = 64 * 1024
+# A chunk is only tokenized up to its last whitespace; the tail is carried into the next chunk
+_TRAILING_TOKEN = re.compile(r'\S*\Z')
+
+
+def load_descriptions(csv_path):
+    """Reads the product descriptions CSV, returning (products, descriptions, total rows)."""
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found: {csv_path}")
 
@@ -12,29 +28,251 @@ def get_top_similar_docs(uploaded_text, csv_path='src/product_descriptions.csv',
     if 'Product' not in df.columns or 'Description' not in df.columns:
         raise ValueError("CSV must contain 'Product' and 'Description' columns.")
 
+    total_rows = len(df)
     df = df.dropna(subset=['Description'])
-    descriptions = df['Description'].astype(str).tolist()
+    return df['Product'].astype(str).str.strip().tolist(), df['Description'].astype(str).tolist(), total_rows
+
+
+def iter_text_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yields a text file in chunks of at most `chunk_size` characters, ignoring undecodable bytes."""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            yield chunk
+
+
+def top_k_indices(scores, k):
+    """Positions of the k largest scores, best first, via partial selection."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=int)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def _fingerprint(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class DocumentIndex:
+    """
+    TF-IDF index over the product descriptions corpus, persisted in `index_dir`.
+
+    The vocabulary and IDF weights are fitted once; the L2-normalised corpus matrix is
+    stored as CSR arrays that are memory-mapped on load. A query is a single transform of
+    the uploaded text and one sparse mat-vec. add_documents() appends new descriptions
+    using the existing vocabulary and IDF, so terms first seen after the fit are ignored
+    until the next rebuild().
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+        self._state = (None, None, [], [])
+        self.meta = {}
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    @property
+    def vectorizer(self):
+        return self._state[0]
+
+    @property
+    def matrix(self):
+        return self._state[1]
+
+    @property
+    def products(self):
+        return self._state[2]
+
+    @property
+    def descriptions(self):
+        return self._state[3]
+
+    def snapshot(self):
+        """(vectorizer, matrix, products, descriptions) of one consistent index version."""
+        return self._state
+
+    def __len__(self):
+        return len(self.descriptions)
 
-    if not descriptions:
-        raise ValueError("No valid descriptions found in the CSV file.")
+    def load(self):
+        """Loads a persisted index, returning False when there is none."""
+        try:
+            with open(self._path(META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(VOCABULARY_FILE), 'r', encoding='utf-8') as f:
+                vocabulary = json.load(f)
+            with open(self._path(DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            idf = np.load(self._path(IDF_FILE))
+            parts = [np.load(self._path(f'matrix_{name}.npy'), mmap_mode='r') for name in MATRIX_FILES]
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Document index not loaded from '{self.index_dir}': {e}")
+            return False
+        vectorizer = TfidfVectorizer(vocabulary=vocabulary)
+        vectorizer.idf_ = idf
+        matrix = sp.csr_matrix(tuple(parts), shape=(len(documents['products']), len(vocabulary)))
+        self._state = (vectorizer, matrix, documents['products'], documents['descriptions'])
+        self.meta = meta
+        return True
 
-    docs = [uploaded_text] + descriptions
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform(docs)
-    similarity_scores = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
+    def _save(self):
+        """Writes every file next to its final name first, so open memory maps are never truncated."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        pending = []
 
-    top_indices = similarity_scores.argsort()[::-1][:top_n]
+        def write(name, save):
+            tmp_path = self._path(name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                save(f)
+            pending.append((tmp_path, self._path(name)))
 
+        def dump_json(obj):
+            return lambda f: f.write(json.dumps(obj, ensure_ascii=False).encode('utf-8'))
+
+        write(VOCABULARY_FILE, dump_json({term: int(col) for term, col in self.vectorizer.vocabulary_.items()}))
+        write(IDF_FILE, lambda f: np.save(f, self.vectorizer.idf_))
+        write(DOCUMENTS_FILE, dump_json({'products': self.products, 'descriptions': self.descriptions}))
+        for name in MATRIX_FILES:
+            write(f'matrix_{name}.npy', lambda f, array=getattr(self.matrix, name): np.save(f, array))
+        # meta.json is replaced last and marks the index as complete
+        write(META_FILE, dump_json(self.meta))
+        for tmp_path, path in pending:
+            os.replace(tmp_path, path)
+
+    def rebuild(self, products, descriptions, meta=None):
+        """Fits the vocabulary/IDF on the full corpus and persists the index."""
+        if not descriptions:
+            raise ValueError("No valid descriptions found in the CSV file.")
+        with self._lock:
+            vectorizer = TfidfVectorizer()
+            matrix = vectorizer.fit_transform(descriptions).tocsr()
+            self._state = (vectorizer, matrix, list(products), list(descriptions))
+            self.meta = dict(meta or {})
+            self._save()
+
+    def add_documents(self, products, descriptions, meta=None):
+        """Appends descriptions to the index without refitting the vocabulary or IDF."""
+        if self.vectorizer is None:
+            return self.rebuild(products, descriptions, meta)
+        with self._lock:
+            vectorizer, matrix, old_products, old_descriptions = self._state
+            matrix = sp.vstack([matrix, vectorizer.transform(descriptions)], format='csr')
+            self._state = (vectorizer, matrix, old_products + list(products), old_descriptions + list(descriptions))
+            self.meta.update(meta or {})
+            self._save()
+
+    def update_meta(self, meta):
+        """Records new CSV metadata when the indexed descriptions themselves are unchanged."""
+        with self._lock:
+            self.meta.update(meta)
+            os.makedirs(self.index_dir, exist_ok=True)
+            tmp_path = self._path(META_FILE + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(META_FILE))
+
+    def sync(self, csv_path):
+        """
+        Brings the index in line with the descriptions CSV. Rows appended to the CSV since
+        the last sync are added incrementally; any other change triggers a full rebuild.
+        """
+        fingerprint = _fingerprint(csv_path)
+        if self.vectorizer is not None and self.meta.get('fingerprint') == fingerprint:
+            return
+        products, descriptions, total_rows = load_descriptions(csv_path)
+        meta = {'fingerprint': fingerprint, 'rows': total_rows, 'documents': len(descriptions)}
+        indexed = self.meta.get('documents', 0)
+        if self.vectorizer is not None and total_rows >= self.meta.get('rows', 0) and len(descriptions) >= indexed \
+                and descriptions[:indexed] == self.descriptions:
+            # A touched CSV, or rows appended without a description, leave nothing to add
+            if len(descriptions) == indexed:
+                self.update_meta(meta)
+            else:
+                self.add_documents(products[indexed:], descriptions[indexed:], meta)
+        else:
+            self.rebuild(products, descriptions, meta)
+
+    def scores(self, text, state=None):
+        """Cosine similarity of `text` to every indexed description (of `state`, if given)."""
+        vectorizer, matrix, _, _ = state or self._state
+        query = vectorizer.transform([text])
+        return np.asarray((matrix @ query.T).todense()).ravel()
+
+    def scores_from_chunks(self, chunks, state=None):
+        """
+        Same as scores(), for text arriving in chunks: term counts are accumulated chunk by
+        chunk, so the whole document never has to be held in memory.
+        """
+        vectorizer, matrix, _, _ = state or self._state
+        analyzer = vectorizer.build_analyzer()
+        vocabulary = vectorizer.vocabulary_
+        counts = Counter()
+        carry = ''
+        for chunk in chunks:
+            text = carry + chunk
+            cut = _TRAILING_TOKEN.search(text).start()
+            if cut == 0 and len(text) > CHUNK_SIZE:
+                cut = len(text)
+            counts.update(term for term in analyzer(text[:cut]) if term in vocabulary)
+            carry = text[cut:]
+        counts.update(term for term in analyzer(carry) if term in vocabulary)
+        if not counts:
+            return np.zeros(matrix.shape[0])
+
+        columns = np.fromiter((vocabulary[term] for term in counts), dtype=np.int64, count=len(counts))
+        weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * vectorizer.idf_[columns]
+        weights /= np.linalg.norm(weights)
+        return np.asarray(matrix[:, columns] @ weights).ravel()
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_document_index(csv_path='src/product_descriptions.csv', index_dir=None):
+    """Process-wide DocumentIndex for a descriptions CSV, loaded from disk and synced with the CSV."""
+    index_dir = index_dir or os.path.splitext(csv_path)[0] + '_tfidf_index'
+    with _indexes_lock:
+        index = _indexes.get(index_dir)
+        if index is None:
+            index = DocumentIndex(index_dir)
+            index.load()
+            _indexes[index_dir] = index
+        index.sync(csv_path)
+    return index
+
+
+def _top_results(scores, products, descriptions, top_n):
     results = []
-    for idx in top_indices:
-        score = similarity_scores[idx]
-        row = df.iloc[idx]
-        product = str(row['Product']).strip()
-        snippet = str(row['Description'])[:300].replace('\n', ' ')
+    for idx in top_k_indices(scores, top_n):
+        score = scores[idx]
+        product = products[idx]
+        snippet = descriptions[idx][:300].replace('\n', ' ')
         results.append({
             'filename': f"{product} (Row {idx + 1})",
+            'product': product,
             'score': float(score),
             'snippet': snippet
         })
-
     return results
+
+
+def get_top_similar_docs(uploaded_text, csv_path='src/product_descriptions.csv', top_n=10):
+    index = get_document_index(csv_path)
+    state = index.snapshot()
+    _, _, products, descriptions = state
+    return _top_results(index.scores(uploaded_text, state), products, descriptions, top_n)
+
+
+def get_top_similar_docs_for_file(uploaded_path, csv_path='src/product_descriptions.csv', top_n=10):
+    """get_top_similar_docs() for an uploaded file, read in CHUNK_SIZE pieces."""
+    index = get_document_index(csv_path)
+    state = index.snapshot()
+    _, _, products, descriptions = state
+    scores = index.scores_from_chunks(iter_text_chunks(uploaded_path), state)
+    return _top_results(scores, products, descriptions, top_n)
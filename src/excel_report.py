@@ -0,0 +1,112 @@
+import os
+import tempfile
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
+
+HEADERS = ["Analysis Type", "Risk Level", "Category", "Product", "Company", "Finding"]
+STREAM_CHUNK_SIZE = 64 * 1024
+
+CROSS_VALIDATION_FILL = PatternFill(start_color="DDEBF7", fill_type="solid")
+RISK_FILLS = {
+    "high": PatternFill(start_color="FFC7CE", fill_type="solid"),
+    "moderate": PatternFill(start_color="FFEB9C", fill_type="solid"),
+    "low": PatternFill(start_color="C6EFCE", fill_type="solid"),
+}
+
+
+def get_risk_fill(risk_level):
+    rl = str(risk_level).lower()
+    for level in ("high", "moderate", "low"):
+        if level in rl:
+            return RISK_FILLS[level]
+    return None
+
+
+def report_rows(all_results):
+    """Yields (row values, fill) for the report: cross-validation results first, then each check."""
+    for item in all_results.get('internal_sim', []):
+        yield [item.get('Type'), item.get('Risk Level'), item.get('Category'), item.get('Product'),
+               item.get('Company'), item.get('Finding')], CROSS_VALIDATION_FILL
+
+    for category_key in ['bom', 'image', 'doc']:
+        for risk_level, items in all_results.get(category_key, {}).items():
+            for item in items:
+                if category_key == 'bom':
+                    row = ["BOM", item.get('Risk Level'), item.get('Category'), item.get('Product'), item.get('Company'),
+                           item.get('Finding')]
+                elif category_key == 'image':
+                    finding = item.get('Finding', '')
+                    if item.get('Risk Level', 'low').lower() != 'low':
+                        finding += f" (Match: {item.get('Brand Image', 'N/A')})"
+                    row = ["Image", item.get('Risk Level'), item.get('Category'), item.get('Uploaded Image'),
+                           item.get('Company'), finding]
+                else:
+                    finding = item.get('Finding', '')
+                    if item.get('Brand Document'):
+                        finding += f" (Match: {item.get('Brand Document')})"
+                    row = ["Document", item.get('Risk Level'), item.get('Category'),
+                           item.get('Uploaded Document', item.get('Product')), item.get('Company'), finding]
+                yield row, get_risk_fill(item.get('Risk Level'))
+
+
+def write_report(all_results, path):
+    """
+    Writes the IP risk report to `path` with a write-only workbook, so rows are streamed to
+    disk as they are produced. Column widths have to be set before the first row in this
+    mode; they come from a first pass over the rows that only measures the values.
+    """
+    widths = [len(str(header)) for header in HEADERS]
+    for row, _ in report_rows(all_results):
+        for col, value in enumerate(row):
+            widths[col] = max(widths[col], len(str(value)))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("IP Risk Report")
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width + 2
+
+    bold = Font(bold=True)
+    header_cells = []
+    for header in HEADERS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = bold
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row, fill in report_rows(all_results):
+        if fill is None:
+            ws.append(row)
+            continue
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(ws, value=value)
+            cell.fill = fill
+            cells.append(cell)
+        ws.append(cells)
+    wb.save(path)
+
+
+def _file_chunks(path, chunk_size):
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+    finally:
+        os.remove(path)
+
+
+def stream_report(all_results, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Writes the report to a temporary file and returns a generator over its bytes in chunks;
+    the file is removed once the generator is exhausted or closed.
+    """
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_report(all_results, path)
+    except Exception:
+        os.remove(path)
+        raise
+    return _file_chunks(path, chunk_size)
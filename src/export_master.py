@@ -0,0 +1,101 @@
+import os
+import pickle
+import threading
+import pandas as pd
+
+from src.bom_screening import ExportIndex
+from src import metrics
+
+
+class ExportMaster:
+    """One loaded version of the export master: the frame, its hash indexes and a version tag."""
+
+    def __init__(self, df, version):
+        self.df = df
+        self.version = version
+        self.index = ExportIndex(df)
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+
+def _fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _compact(df):
+    """Stores repetitive text columns (categories, HS codes, countries...) as pandas categoricals."""
+    for column in df.columns:
+        if pd.api.types.is_string_dtype(df[column]) and len(df) and df[column].nunique(dropna=True) < 0.5 * len(df):
+            df[column] = df[column].astype('category')
+    return df
+
+
+class ExportMasterCache:
+    """
+    Process-wide cache of the export master CSV.
+
+    get() stats the CSV (mtime and size) and only re-parses it when it changed; the new
+    ExportMaster is built off to the side and swapped in with a single assignment, so
+    concurrent requests keep using the previous version until the new one is complete.
+    When snapshot_path is given the parsed frame is also pickled there, and a cold start
+    loads that instead of the CSV as long as the CSV has not changed since.
+    """
+
+    def __init__(self, csv_path, loader, snapshot_path=None):
+        self.csv_path = csv_path
+        self.loader = loader
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._master = None
+        self._fingerprint = None
+
+    def get(self):
+        fingerprint = _fingerprint(self.csv_path)
+        master = self._master
+        if master is not None and fingerprint == self._fingerprint:
+            metrics.inc('cache_requests_total', cache='export_master', result='hit')
+            return master
+        with self._lock:
+            if self._master is None or fingerprint != self._fingerprint:
+                metrics.inc('cache_requests_total', cache='export_master', result='miss')
+                self._master = self._load(fingerprint)
+                self._fingerprint = fingerprint
+            return self._master
+
+    def _load(self, fingerprint):
+        if fingerprint is None:
+            return ExportMaster(pd.DataFrame(), 'missing')
+        version = f"{fingerprint[0]}-{fingerprint[1]}"
+        df = self._read_snapshot(fingerprint)
+        if df is None:
+            df = _compact(self.loader(self.csv_path))
+            self._write_snapshot(fingerprint, df)
+        return ExportMaster(df, version)
+
+    def _read_snapshot(self, fingerprint):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                saved_fingerprint, df = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable export snapshot '{os.path.basename(self.snapshot_path)}': {e}")
+            return None
+        return df if tuple(saved_fingerprint) == fingerprint else None
+
+    def _write_snapshot(self, fingerprint, df):
+        if not self.snapshot_path or df.empty:
+            return
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((fingerprint, df), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            print(f"Could not write export snapshot: {e}")
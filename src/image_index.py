@@ -0,0 +1,482 @@
+import os
+import json
+import hashlib
+import time
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait
+import cv2
+import numpy as np
+from skimage.metrics import structural_similarity as ssim
+
+from src.perceptual_hash import HammingIndex, image_hashes
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+IMAGE_SIZE = (256, 256)
+HIST_BINS = [8, 8, 8]
+HIST_LENGTH = 8 * 8 * 8
+HIGH_CORRELATION = 0.85
+MODERATE_CORRELATION = 0.65
+HIGH_SSIM = 0.80
+MODERATE_SSIM = 0.60
+# Below this many images to decode, refresh() stays in-process
+PARALLEL_DECODE_MIN = 32
+
+MANIFEST_FILE = 'manifest.json'
+HISTOGRAMS_FILE = 'histograms.npy'
+THUMBNAILS_FILE = 'thumbnails.npy'
+HASHES_FILE = 'hashes.npy'
+LOCK_FILE = 'index.lock'
+
+
+@contextmanager
+def _file_lock(path):
+    """Holds an exclusive lock on `path` across processes (an index is rebuilt by one process at a time)."""
+    with open(path, 'a+b') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def histogram_from_image(img_cv):
+    """Normalised 8x8x8 BGR histogram of an already decoded image, resized to IMAGE_SIZE first."""
+    img_cv = cv2.resize(img_cv, IMAGE_SIZE)
+    hist = cv2.calcHist([img_cv], [0, 1, 2], None, HIST_BINS, [0, 256, 0, 256, 0, 256])
+    return cv2.normalize(hist, hist).flatten().astype('float32')
+
+
+def grayscale_thumbnail(img_cv):
+    """256x256 grayscale version of an image, the input SSIM is computed on."""
+    return cv2.cvtColor(cv2.resize(img_cv, IMAGE_SIZE), cv2.COLOR_BGR2GRAY)
+
+
+def unit_histograms(hist_matrix):
+    """
+    Mean-centres and L2-normalises every row of an (N, 512) histogram matrix, so that
+    cv2.HISTCMP_CORREL against all rows becomes a single matrix-vector product.
+    """
+    centered = np.asarray(hist_matrix, dtype='float32').reshape(-1, HIST_LENGTH)
+    centered = centered - centered.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=1, keepdims=True)
+    return np.divide(centered, norms, out=np.zeros_like(centered), where=norms > 0)
+
+
+def correlation_scores(query_hist, unit_matrix):
+    """cv2.compareHist(query, row, cv2.HISTCMP_CORREL) for every row of a unit_histograms() matrix."""
+    query = unit_histograms(query_hist)[0]
+    scores = unit_matrix @ query
+    if not query.any():
+        # OpenCV reports a perfect correlation when either histogram is flat
+        scores[:] = 1.0
+    scores[~unit_matrix.any(axis=1)] = 1.0
+    return scores
+
+
+def score_histograms(query_hist, unit_matrix, top_k=10):
+    """
+    Correlates one histogram with a whole catalog matrix in one pass.
+
+    Returns a dict with the raw 'scores', the 'top' k row positions (best first) and the
+    'high' (> 0.85) and 'moderate' (> 0.65) buckets as row positions, best first.
+    """
+    scores = correlation_scores(query_hist, unit_matrix)
+    k = min(top_k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k] if k else np.zeros(0, dtype=int)
+    top = top[np.argsort(-scores[top], kind='stable')]
+    order = np.argsort(-scores, kind='stable')
+    ranked = scores[order]
+    high = order[ranked > HIGH_CORRELATION]
+    moderate = order[(ranked > MODERATE_CORRELATION) & (ranked <= HIGH_CORRELATION)]
+    return {'scores': scores, 'top': top, 'high': high, 'moderate': moderate}
+
+
+def ssim_shortlist(histogram_result, size):
+    """
+    Positions that go on to the SSIM stage: the top `size` by correlation plus every
+    position already above the Moderate threshold, in catalog order. Anything left out
+    has a correlation <= 0.65 and is only missed if SSIM alone would have flagged it.
+    """
+    keep = set(histogram_result['top'][:size].tolist())
+    keep.update(histogram_result['high'].tolist())
+    keep.update(histogram_result['moderate'].tolist())
+    return sorted(keep)
+
+
+def _scan_catalog(images_folder):
+    """Returns {(brand, name): (mtime_ns, size)} for every catalog image on disk."""
+    found = {}
+    if not os.path.isdir(images_folder):
+        return found
+    for brand_entry in os.scandir(images_folder):
+        if not brand_entry.is_dir():
+            continue
+        for entry in os.scandir(brand_entry.path):
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS) or not entry.is_file():
+                continue
+            stat = entry.stat()
+            found[(brand_entry.name, entry.name)] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def risk_level(correlation, ssim_score=None):
+    """'High', 'Moderate' or 'Low' for a histogram correlation and an optional SSIM score."""
+    if correlation > HIGH_CORRELATION or (ssim_score is not None and ssim_score > HIGH_SSIM):
+        return "High"
+    if correlation > MODERATE_CORRELATION or (ssim_score is not None and ssim_score > MODERATE_SSIM):
+        return "Moderate"
+    return "Low"
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers=None):
+    """
+    The shared decode/scan pool, sized `max_workers` (one per core when None). A call with
+    another size replaces it; work already submitted to the old pool still completes.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None and _pool_workers != max_workers:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers)
+            _pool_workers = max_workers
+        return _pool
+
+
+def shutdown_pool():
+    """Stops the decode/scan worker processes, if they were started."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _shards(keys):
+    """Groups (brand, name) keys by brand folder, in sorted brand order."""
+    shards = {}
+    for key in keys:
+        shards.setdefault(key[0], []).append(key)
+    return [shards[brand] for brand in sorted(shards)]
+
+
+def extract_features(images_folder, keys):
+    """
+    Decodes catalog images and returns {(brand, name): (histogram, thumbnail, hashes)};
+    unreadable images map to None. Runs in a pool worker for index rebuilds.
+    """
+    features = {}
+    for key in keys:
+        img_cv = cv2.imread(os.path.join(images_folder, key[0], key[1]))
+        if img_cv is None:
+            features[key] = None
+            continue
+        thumbnail = grayscale_thumbnail(img_cv)
+        features[key] = (histogram_from_image(img_cv), thumbnail, image_hashes(thumbnail))
+    return features
+
+
+def extract_features_parallel(images_folder, keys, max_workers=None):
+    """extract_features() with the keys sharded by brand folder across the process pool."""
+    keys = list(keys)
+    if len(keys) < PARALLEL_DECODE_MIN or max_workers == 1:
+        return extract_features(images_folder, keys)
+    pool = _get_pool(max_workers)
+    features = {}
+    for shard in [pool.submit(extract_features, images_folder, shard) for shard in _shards(keys)]:
+        features.update(shard.result())
+    return features
+
+
+def scan_shard(images_folder, keys, query_hist, query_gray, deadline=None):
+    """
+    Decodes and scores one shard of catalog images against an uploaded image, returning
+    (matches above Low, finished). Stops early, with finished=False, once `deadline`
+    (a time.time() value) has passed.
+    """
+    query_unit = unit_histograms(query_hist)
+    matches = []
+    for key in keys:
+        if deadline is not None and time.time() > deadline:
+            return matches, False
+        img_cv = cv2.imread(os.path.join(images_folder, key[0], key[1]))
+        if img_cv is None:
+            continue
+        hist = histogram_from_image(img_cv)
+        correlation = float(correlation_scores(hist, query_unit)[0])
+        try:
+            ssim_score = round(float(ssim(query_gray, grayscale_thumbnail(img_cv))), 4)
+        except ValueError:
+            ssim_score = None
+        level = risk_level(correlation, ssim_score)
+        if level != "Low":
+            matches.append({'brand': key[0], 'name': key[1], 'correlation': correlation,
+                            'ssim': ssim_score, 'risk_level': level})
+    return matches, True
+
+
+def parallel_scan(images_folder, query_hist, query_gray, brands=None, max_workers=None, time_budget=None):
+    """
+    Index-free image check: every catalog image of the given brand folders (all when None)
+    is decoded and scored on the process pool, one shard per brand folder.
+
+    Returns (matches, complete). Matches are dicts with brand, name, correlation, ssim and
+    risk_level, in (brand, name) order whatever order the shards finish in. With a
+    `time_budget` in seconds, the matches found when it runs out are returned with
+    complete=False. With max_workers=1 the scan runs in the calling process.
+    """
+    keys = [key for key in sorted(_scan_catalog(images_folder)) if brands is None or key[0] in brands]
+    if not keys:
+        return [], True
+    deadline = time.time() + time_budget if time_budget is not None else None
+    if max_workers == 1:
+        matches, complete = scan_shard(images_folder, keys, query_hist, query_gray, deadline)
+        return sorted(matches, key=lambda match: (match['brand'], match['name'])), complete
+    pool = _get_pool(max_workers)
+    futures = [pool.submit(scan_shard, images_folder, shard, query_hist, query_gray, deadline)
+               for shard in _shards(keys)]
+    # Workers check the deadline between images; allow one decode's worth of slack
+    done, not_done = wait(futures, timeout=None if deadline is None else time_budget + 1.0)
+    for future in not_done:
+        future.cancel()
+    matches, complete = [], not not_done
+    for future in done:
+        shard_matches, finished = future.result()
+        matches.extend(shard_matches)
+        complete = complete and finished
+    matches.sort(key=lambda match: (match['brand'], match['name']))
+    return matches, complete
+
+
+class ImageFeatureIndex:
+    """
+    On-disk feature store for the brand image catalog.
+
+    Histograms (N, 512), grayscale thumbnails (N, 256, 256) and (pHash, dHash) codes (N, 2)
+    are kept as .npy files that are memory-mapped on load, next to a manifest listing
+    (brand, name, mtime, size) for each row. refresh() only decodes images that were added
+    or changed since the last build (on the process pool, sharded by brand folder, when
+    there are many) and drops rows for removed files.
+
+    Each build is written under a new generation name and published by replacing the
+    manifest, holding a lock file so processes sharing the folder rebuild one at a time.
+    """
+
+    def __init__(self, images_folder, index_folder, check_interval=30, max_workers=None):
+        self.images_folder = images_folder
+        self.index_folder = index_folder
+        self.check_interval = check_interval
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._unreadable = {}
+        self._generation = None
+        self._set_state([], np.zeros((0, HIST_LENGTH), dtype='float32'),
+                        np.zeros((0,) + IMAGE_SIZE, dtype='uint8'), np.zeros((0, 2), dtype='uint64'))
+        os.makedirs(index_folder, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.index_folder, name)
+
+    @property
+    def entries(self):
+        return self._state['entries']
+
+    @property
+    def histograms(self):
+        return self._state['histograms']
+
+    @property
+    def thumbnails(self):
+        return self._state['thumbnails']
+
+    @property
+    def hashes(self):
+        return self._state['hashes']
+
+    @property
+    def version(self):
+        """Digest of the manifest; changes whenever a catalog image is added, changed or removed."""
+        return self._state['version']
+
+    def _set_state(self, entries, histograms, thumbnails, hashes):
+        self._state = {
+            'entries': entries,
+            'histograms': histograms,
+            'unit_histograms': unit_histograms(histograms),
+            'thumbnails': thumbnails,
+            'hashes': hashes,
+            'phash_index': HammingIndex(hashes[:, 0]),
+            'version': hashlib.sha256(json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest(),
+        }
+
+    def snapshot(self):
+        """
+        The current entries, histograms, unit histograms, thumbnails, hashes and pHash
+        index captured together, safe to use while a refresh runs.
+        """
+        return self._state
+
+    def _data_files(self, generation):
+        """Paths of the histogram, thumbnail and hash files of an index generation."""
+        names = (HISTOGRAMS_FILE, THUMBNAILS_FILE, HASHES_FILE)
+        if generation is None:
+            # Indexes written before generations were introduced use the plain names
+            return [self._path(name) for name in names]
+        return [self._path(f"{os.path.splitext(name)[0]}-{generation}.npy") for name in names]
+
+    def _read_manifest(self):
+        with open(self._path(MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):
+            manifest = {'generation': None, 'entries': manifest}
+        return manifest
+
+    def load(self):
+        """Loads the persisted index, returning False when there is none (or it is unreadable)."""
+        with _file_lock(self._path(LOCK_FILE)):
+            return self._load()
+
+    def _load(self):
+        try:
+            manifest = self._read_manifest()
+            histograms_path, thumbnails_path, hashes_path = self._data_files(manifest['generation'])
+            histograms = np.load(histograms_path, mmap_mode='r')
+            thumbnails = np.load(thumbnails_path, mmap_mode='r')
+            hashes = np.load(hashes_path)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Image index not loaded from '{self.index_folder}': {e}")
+            return False
+        entries = manifest['entries']
+        if not len(entries) == len(histograms) == len(thumbnails) == len(hashes):
+            print("Image index is inconsistent, it will be rebuilt.")
+            return False
+        self._set_state(entries, histograms, thumbnails, hashes)
+        self._generation = manifest['generation']
+        return True
+
+    def _disk_generation(self):
+        try:
+            return self._read_manifest().get('generation')
+        except (OSError, ValueError):
+            return None
+
+    def refresh(self, force=False):
+        """Brings the index in line with the catalog folder. Returns True if it changed."""
+        if not force and time.time() - self._last_check < self.check_interval:
+            return False
+        with self._lock, _file_lock(self._path(LOCK_FILE)):
+            self._last_check = time.time()
+            # Another process may have published a newer build while this one waited for the lock
+            if self._disk_generation() not in (None, self._generation):
+                self._load()
+            old = self._state
+            on_disk = {key: stamp for key, stamp in _scan_catalog(self.images_folder).items()
+                       if self._unreadable.get(key) != stamp}
+
+            reusable = {}
+            for row, entry in enumerate(old['entries']):
+                key = (entry['brand'], entry['name'])
+                if on_disk.get(key) == (entry['mtime'], entry['size']):
+                    reusable[key] = row
+            if len(reusable) == len(old['entries']) == len(on_disk):
+                return False
+
+            keys = sorted(on_disk)
+            decoded = extract_features_parallel(self.images_folder, [key for key in keys if key not in reusable],
+                                                self.max_workers)
+            new_features, new_entries = {}, []
+            for key in keys:
+                if key not in reusable:
+                    if decoded[key] is None:
+                        self._unreadable[key] = on_disk[key]
+                        continue
+                    new_features[key] = decoded[key]
+                new_entries.append(key)
+
+            tmp_hists, tmp_thumbs, tmp_hashes = (self._temp_file('.npy') for _ in range(3))
+            hists = np.lib.format.open_memmap(tmp_hists, mode='w+', dtype='float32',
+                                              shape=(len(new_entries), HIST_LENGTH))
+            thumbs = np.lib.format.open_memmap(tmp_thumbs, mode='w+', dtype='uint8',
+                                               shape=(len(new_entries),) + IMAGE_SIZE)
+            hashes = np.zeros((len(new_entries), 2), dtype='uint64')
+            manifest = []
+            for row, key in enumerate(new_entries):
+                if key in reusable:
+                    hists[row] = old['histograms'][reusable[key]]
+                    thumbs[row] = old['thumbnails'][reusable[key]]
+                    hashes[row] = old['hashes'][reusable[key]]
+                else:
+                    hists[row], thumbs[row], hashes[row] = new_features[key]
+                mtime, size = on_disk[key]
+                manifest.append({'brand': key[0], 'name': key[1], 'mtime': mtime, 'size': size})
+            hists.flush()
+            thumbs.flush()
+            del hists, thumbs
+            with open(tmp_hashes, 'wb') as f:
+                np.save(f, hashes)
+
+            # The arrays go to new file names, so no file that is memory-mapped (here or in
+            # another process) is ever replaced; switching the manifest publishes them.
+            generation = uuid.uuid4().hex
+            files = self._data_files(generation)
+            for tmp, path in zip((tmp_hists, tmp_thumbs, tmp_hashes), files):
+                os.replace(tmp, path)
+            tmp_manifest = self._temp_file('.json')
+            with open(tmp_manifest, 'w', encoding='utf-8') as f:
+                json.dump({'generation': generation, 'entries': manifest}, f)
+            os.replace(tmp_manifest, self._path(MANIFEST_FILE))
+
+            dropped = len(old['entries']) - len(reusable)
+            del old
+            self._set_state(manifest, np.load(files[0], mmap_mode='r'), np.load(files[1], mmap_mode='r'), hashes)
+            self._generation = generation
+            self._remove_old_generations(files)
+            print(f"Image index updated: {len(manifest)} images "
+                  f"({len(new_features)} decoded, {dropped} dropped).")
+            return True
+
+    def _temp_file(self, suffix):
+        fd, path = tempfile.mkstemp(dir=self.index_folder, suffix=suffix + '.tmp')
+        os.close(fd)
+        return path
+
+    def _remove_old_generations(self, keep):
+        """Deletes the data files of earlier builds; files still mapped elsewhere (on Windows) go next time."""
+        prefixes = tuple(os.path.splitext(name)[0] for name in (HISTOGRAMS_FILE, THUMBNAILS_FILE, HASHES_FILE))
+        keep = {os.path.basename(path) for path in keep}
+        for name in os.listdir(self.index_folder):
+            if name.startswith(prefixes) and name.endswith('.npy') and name not in keep:
+                try:
+                    os.remove(self._path(name))
+                except OSError:
+                    pass
+
+    def rows_for_brands(self, brands=None, entries=None):
+        """Row numbers of the catalog images that belong to the given brand folders (all when None)."""
+        entries = self.entries if entries is None else entries
+        if brands is None:
+            return list(range(len(entries)))
+        brands = set(brands)
+        return [row for row, entry in enumerate(entries) if entry['brand'] in brands]
@@ -1,8 +1,12 @@
 import os
-import requests
+import sys
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-import time
+
+# Runnable as `python src/image_similarity.py` as well as `python -m src.image_similarity`
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src.scraping import HEADERS, make_session, content_hash, KeyRateLimiter, Checkpoint
 
 # Rotating SerpAPI Keys
 SERPAPI_KEYS = [
@@ -13,14 +17,13 @@ SERPAPI_KEYS = [
     "b9d116b3a340ee26f33fb36e18fe6b39280b13bebf1c1c691bec6054e9da68f1"
 ]
 
-HEADERS = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-}
-
 NUM_IMAGES = 20
 RETRY_LIMIT = 10
-SLEEP_BETWEEN_ATTEMPTS = 1  # seconds
+SLEEP_BETWEEN_ATTEMPTS = 1  # seconds between two searches with the same key
 SAVE_DIR = "images"
+SEARCH_URL = os.environ.get("SERPAPI_URL", "https://serpapi.com/search.json")
+MAX_WORKERS = 8
+CHECKPOINT_FILE = "scrape_checkpoint.json"
 
 # List of 200+ industrial products
 PRODUCTS = [
@@ -71,13 +74,10 @@ PRODUCTS = [
     "Power Factor Controller", "Inductive Coupler"
 ]
 
-def get_next_key(index):
-    return SERPAPI_KEYS[index % len(SERPAPI_KEYS)]
-
-def fetch_images(product, api_key):
+def fetch_images(product, api_key, session=None, search_url=SEARCH_URL):
     try:
-        response = requests.get(
-            "https://serpapi.com/search.json",
+        response = (session or make_session()).get(
+            search_url,
             headers=HEADERS,
             params={
                 "q": product,
@@ -105,75 +105,126 @@ def extract_brand_from_title(title):
         return words[0]
     return "Unknown"
 
-def save_image(url, path):
+def download_image(url, session):
     try:
-        img_data = requests.get(url, timeout=10).content
-        with open(path, 'wb') as handler:
-            handler.write(img_data)
-        return True
+        response = session.get(url, timeout=10)
+        response.raise_for_status()
+        return response.content
     except Exception as e:
-        print(f"[ERROR] Could not save image from {url}: {e}")
-        return False
+        print(f"[ERROR] Could not download image from {url}: {e}")
+        return None
 
 def ensure_dir(path):
     if not os.path.exists(path):
         os.makedirs(path)
 
-def scrape_images():
-    ensure_dir(SAVE_DIR)
-    key_index = 0
-
-    for product in tqdm(PRODUCTS, desc="Scraping Products"):
-        product_folder = os.path.join(SAVE_DIR, sanitize_filename(product))
-        ensure_dir(product_folder)
-
-        metadata = []
-        count = 0
-        attempts = 0
-        used_filenames = set()
-
-        while count < NUM_IMAGES and attempts < RETRY_LIMIT:
-            key = get_next_key(key_index)
-            key_index += 1
-            results = fetch_images(product, key)
-
-            for result in results:
-                if count >= NUM_IMAGES:
-                    break
-
-                title = result.get("title", "")
-                if product.lower() not in title.lower():
+def scrape_product(product, save_dir, session, limiter, checkpoint, search_url=SEARCH_URL):
+    """
+    Collects up to NUM_IMAGES images of one product. URLs already downloaded by an earlier
+    run are reused from the checkpoint, and images whose bytes were already saved (for any
+    product) are skipped. Returns the product metadata.
+    """
+    product_folder = os.path.join(save_dir, sanitize_filename(product))
+    ensure_dir(product_folder)
+
+    metadata = []
+    count = 0
+    attempts = 0
+    used_filenames = set()
+
+    while count < NUM_IMAGES and attempts < RETRY_LIMIT:
+        results = fetch_images(product, limiter.acquire(), session, search_url)
+
+        for result in results:
+            if count >= NUM_IMAGES:
+                break
+
+            title = result.get("title", "")
+            if product.lower() not in title.lower():
+                continue
+
+            brand = extract_brand_from_title(title)
+            filename = sanitize_filename(f"{brand}_{product}")
+            if filename.lower() in used_filenames:
+                continue
+
+            url = result.get("original")
+            if not url:
+                continue
+            filepath = os.path.join(product_folder, f"{filename}.jpg")
+            relpath = os.path.relpath(filepath, save_dir)
+
+            if checkpoint.state["downloaded"].get(url) != relpath or not os.path.exists(filepath):
+                data = download_image(url, session)
+                if data is None:
                     continue
+                digest = content_hash(data)
 
-                brand = extract_brand_from_title(title)
-                filename = sanitize_filename(f"{brand}_{product}")
-                if filename.lower() in used_filenames:
-                    continue
+                def claim(state):
+                    # Same bytes already saved under another name: a duplicate, not a new image
+                    if state["hashes"].setdefault(digest, relpath) != relpath:
+                        return False
+                    state["downloaded"][url] = relpath
+                    return True
 
-                url = result.get("original")
-                filepath = os.path.join(product_folder, f"{filename}.jpg")
-
-                if save_image(url, filepath):
-                    metadata.append({
-                        "filename": f"{filename}.jpg",
-                        "url": url,
-                        "product": product,
-                        "brand": brand,
-                        "title": title
-                    })
-                    used_filenames.add(filename.lower())
-                    count += 1
-
-            attempts += 1
-            time.sleep(SLEEP_BETWEEN_ATTEMPTS)
-
-        # Save metadata
-        metadata_path = os.path.join(product_folder, "metadata.json")
-        try:
-            with open(metadata_path, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, indent=2, ensure_ascii=False)
-        except Exception as e:
-            print(f"[ERROR] Failed to save metadata for {product}: {e}")
+                # Saved with the product (see scrape_images), not once per image
+                if not checkpoint.update(claim, save=False):
+                    continue
+                with open(filepath + ".tmp", 'wb') as handler:
+                    handler.write(data)
+                os.replace(filepath + ".tmp", filepath)
+
+            metadata.append({
+                "filename": f"{filename}.jpg",
+                "url": url,
+                "product": product,
+                "brand": brand,
+                "title": title
+            })
+            used_filenames.add(filename.lower())
+            count += 1
+
+        attempts += 1
+
+    # Save metadata
+    metadata_path = os.path.join(product_folder, "metadata.json")
+    try:
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+    except Exception as e:
+        print(f"[ERROR] Failed to save metadata for {product}: {e}")
+    return metadata
+
+def scrape_images(products=None, save_dir=SAVE_DIR, search_url=SEARCH_URL, api_keys=None, max_workers=MAX_WORKERS):
+    """
+    Scrapes the catalog with a pool of `max_workers` threads sharing one pooled HTTP
+    session. Each API key is used at most once per SLEEP_BETWEEN_ATTEMPTS seconds.
+    Finished products, downloaded URLs and image content hashes are checkpointed in
+    `save_dir`/CHECKPOINT_FILE once per product, so a rerun skips what an earlier
+    (crashed) run finished; images of a product cut short are downloaded again.
+    """
+    ensure_dir(save_dir)
+    products = PRODUCTS if products is None else products
+    limiter = KeyRateLimiter(api_keys or SERPAPI_KEYS, rate=1.0 / SLEEP_BETWEEN_ATTEMPTS)
+    checkpoint = Checkpoint(os.path.join(save_dir, CHECKPOINT_FILE),
+                            {"completed": [], "downloaded": {}, "hashes": {}})
+    completed = set(checkpoint.state["completed"])
+    pending = [product for product in products if product not in completed]
+    session = make_session(pool_size=max_workers)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scrape_product, product, save_dir, session, limiter, checkpoint, search_url): product
+                   for product in pending}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Scraping Products"):
+            product = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[ERROR] Scraping {product} failed: {e}")
+                # Keep the images it did download
+                checkpoint.save()
+                continue
+            checkpoint.update(lambda state: state["completed"].append(product))
 
 if __name__ == "__main__":
     scrape_images()
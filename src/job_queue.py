@@ -0,0 +1,165 @@
+import os
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from src.result_store import DEFAULT_TTL
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+# Seconds between heartbeats of the process that owns a job, and after which a silent owner is presumed dead
+HEARTBEAT_INTERVAL = 10
+STALE_AFTER = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    inputs TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT,
+    heartbeat REAL
+)
+"""
+
+
+def _without_nan(value):
+    """Replaces float NaN (empty BOM/export cells) with None, so results stay valid JSON."""
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, dict):
+        return {key: _without_nan(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_without_nan(item) for item in value]
+    return value
+
+
+class JobQueue:
+    """
+    Background runner for analysis jobs, persisted in a SQLite table.
+
+    submit() stores the job inputs (a JSON-serialisable dict) and hands them to
+    `runner(inputs, progress)` on a thread pool; the runner reports its stage through
+    `progress(stage, fraction)` and returns a JSON-serialisable result.
+
+    Several processes (web workers) can share the table: each queued or running job is
+    owned by the process that runs it, which keeps its heartbeat fresh. Jobs whose owner
+    stopped sending heartbeats (a crashed or restarted worker) are claimed and started
+    again by another process. Finished jobs are deleted `ttl` seconds after they ended.
+    """
+
+    def __init__(self, db_path, runner, max_workers=2, ttl=DEFAULT_TTL):
+        self.db_path = db_path
+        self.runner = runner
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._started = False
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (('owner', 'TEXT'), ('heartbeat', 'REAL')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    @property
+    def owner(self):
+        # Read on every use, so a queue created before a fork is owned by each child separately
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _start(self):
+        """Starts the heartbeat and claims stale jobs on first use, so merely importing the app starts no work."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._requeue_stale()
+        threading.Thread(target=self._heartbeat, name='analysis-job-heartbeat', daemon=True).start()
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            try:
+                with self._lock, self._connect() as conn:
+                    conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN (?, ?)",
+                                 (time.time(), self.owner, QUEUED, RUNNING))
+                self._requeue_stale()
+            except sqlite3.Error as e:
+                print(f"Analysis job heartbeat failed: {e}")
+
+    def _requeue_stale(self):
+        """Claims and restarts queued/running jobs whose owner has stopped sending heartbeats."""
+        now = time.time()
+        stale = now - STALE_AFTER
+        claimed = []
+        with self._lock, self._connect() as conn:
+            pending = conn.execute("SELECT id, inputs FROM jobs WHERE status IN (?, ?) AND "
+                                   "(heartbeat IS NULL OR heartbeat < ?) ORDER BY created",
+                                   (QUEUED, RUNNING, stale)).fetchall()
+            for job_id, inputs in pending:
+                # The heartbeat condition is checked again, so only one process wins a job
+                cursor = conn.execute("UPDATE jobs SET status = ?, stage = NULL, progress = 0, owner = ?, "
+                                      "heartbeat = ?, updated = ? WHERE id = ? AND status IN (?, ?) AND "
+                                      "(heartbeat IS NULL OR heartbeat < ?)",
+                                      (QUEUED, self.owner, now, now, job_id, QUEUED, RUNNING, stale))
+                if cursor.rowcount == 1:
+                    claimed.append((job_id, json.loads(inputs)))
+        for job_id, inputs in claimed:
+            self._executor.submit(self._run, job_id, inputs)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _update(self, job_id, **fields):
+        fields['updated'] = fields['heartbeat'] = time.time()
+        columns = ', '.join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", list(fields.values()) + [job_id])
+
+    def submit(self, inputs):
+        """Queues a job and returns its id."""
+        self._start()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, now - self.ttl))
+            conn.execute("INSERT INTO jobs (id, status, progress, inputs, created, updated, owner, heartbeat) "
+                         "VALUES (?, ?, 0, ?, ?, ?, ?, ?)",
+                         (job_id, QUEUED, json.dumps(inputs), now, now, self.owner, now))
+        self._executor.submit(self._run, job_id, inputs)
+        return job_id
+
+    def _run(self, job_id, inputs):
+        self._update(job_id, status=RUNNING)
+
+        def progress(stage, fraction):
+            self._update(job_id, stage=stage, progress=round(float(fraction), 3))
+
+        try:
+            result = self.runner(inputs, progress)
+        except Exception as e:
+            print(f"Analysis job {job_id} failed: {e}")
+            self._update(job_id, status=FAILED, error=str(e))
+            return
+        self._update(job_id, status=DONE, stage=None, progress=1.0,
+                     result=json.dumps(_without_nan(result), default=str, allow_nan=False))
+
+    def get(self, job_id):
+        """Status dict of a job (with its result once done), or None for an unknown id."""
+        self._start()
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, status, stage, progress, result, error, created, updated FROM jobs "
+                               "WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'status', 'stage', 'progress', 'result', 'error', 'created', 'updated'), row))
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
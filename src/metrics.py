@@ -0,0 +1,130 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans of the current request, when it asked for a timing breakdown (see collect_spans)
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Registry:
+    """
+    In-process counters and latency histograms, rendered in the Prometheus text format.
+
+    Metrics are created on first use: inc() for counters, observe() and span() for
+    histograms. Values only cover this process; work done in pool worker processes is
+    timed by the span around it in the parent.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            counts = histogram[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def span(self, stage):
+        """Times a block into the 'stage_duration_seconds' histogram (and the request's spans)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_duration_seconds', elapsed, stage=stage)
+            spans = _request_spans.get()
+            if spans is not None:
+                spans.append((stage, elapsed))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (counts, total, count) in sorted(self._histograms[name].items()):
+                    for bound, bucket_count in zip(self.buckets, counts):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {bucket_count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+registry.describe('stage_duration_seconds', "Duration of analysis stages.")
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def span(stage):
+    return registry.span(stage)
+
+
+def collect_spans():
+    """
+    Starts recording the spans of the current context; returns the list they are added to
+    and the token to pass to reset_spans() when the request is over.
+    """
+    spans = []
+    return spans, _request_spans.set(spans)
+
+
+def reset_spans(token):
+    """Stops the recording started by collect_spans(), so a reused thread does not keep adding to it."""
+    _request_spans.reset(token)
+
+
+def server_timing(spans):
+    """A Server-Timing header value for recorded (stage, seconds) spans."""
+    return ', '.join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in spans)
@@ -1,10 +1,45 @@
+import pandas as pd
+
+KEY_COLUMNS = ['Description', 'Origin Country']
+
+
+def _bom_pairs(bom):
+    return pd.MultiIndex.from_arrays([bom['Product Description'], bom['Origin Country']])
+
+
+def _buyer_pairs(buyer_df):
+    """Distinct (Description, Origin Country) pairs of a buyer; rows with a missing value never match."""
+    return pd.MultiIndex.from_frame(buyer_df[KEY_COLUMNS].dropna()).unique()
+
+
 def compute_match(bom, buyer_df):
-    matches = 0
-    for _, bom_row in bom.iterrows():
-        found = buyer_df[
-            (buyer_df['Description'] == bom_row['Product Description']) &
-            (buyer_df['Origin Country'] == bom_row['Origin Country'])
-        ]
-        if not found.empty:
-            matches += 1
-    return matches / len(bom) if len(bom) > 0 else 0
+    """Share of BOM rows whose (Product Description, Origin Country) appears in the buyer's records."""
+    if len(bom) == 0:
+        return 0
+    matches = _bom_pairs(bom).isin(_buyer_pairs(buyer_df)).sum()
+    return matches / len(bom)
+
+
+def compute_match_many(bom, buyer_dfs):
+    """
+    compute_match() of one BOM against many buyers in a single join.
+
+    `buyer_dfs` is a list or a dict of buyer DataFrames; the ratios come back as a list
+    in the same order, or a dict with the same keys.
+    """
+    labels = list(buyer_dfs.keys()) if isinstance(buyer_dfs, dict) else list(range(len(buyer_dfs)))
+    frames = list(buyer_dfs.values()) if isinstance(buyer_dfs, dict) else list(buyer_dfs)
+    ratios = [0] * len(frames)
+
+    if len(bom) and frames:
+        bom_rows = pd.DataFrame({'Description': bom['Product Description'].to_numpy(),
+                                 'Origin Country': bom['Origin Country'].to_numpy()}).dropna()
+        bom_rows['bom_row'] = bom_rows.index
+        buyers = pd.concat([frame[KEY_COLUMNS].assign(buyer=position) for position, frame in enumerate(frames)],
+                           ignore_index=True).dropna().drop_duplicates()
+        joined = bom_rows.merge(buyers, on=KEY_COLUMNS, how='inner')
+        counts = joined.groupby('buyer')['bom_row'].nunique()
+        for position, count in counts.items():
+            ratios[position] = count / len(bom)
+
+    return dict(zip(labels, ratios)) if isinstance(buyer_dfs, dict) else ratios
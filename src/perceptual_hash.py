@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+
+HASH_BITS = 64
+# Largest pHash Hamming distance still reported as a near-duplicate (resize, recompression, light crop)
+NEAR_DUPLICATE_DISTANCE = 6
+
+_POPCOUNT_8 = np.array([bin(i).count('1') for i in range(256)], dtype='uint8')
+
+
+def _pack_bits(bits):
+    code = 0
+    for bit in np.asarray(bits).flatten():
+        code = (code << 1) | int(bool(bit))
+    return code
+
+
+def phash(gray):
+    """64-bit DCT perceptual hash of a grayscale image."""
+    small = cv2.resize(np.asarray(gray), (32, 32), interpolation=cv2.INTER_AREA).astype('float32')
+    low = cv2.dct(small)[:8, :8]
+    return _pack_bits(low > np.median(low.flatten()[1:]))
+
+
+def dhash(gray):
+    """64-bit difference hash: is each pixel brighter than its right neighbour, on a 9x8 image."""
+    small = cv2.resize(np.asarray(gray), (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+def image_hashes(gray):
+    """(pHash, dHash) of a grayscale image as Python ints."""
+    return phash(gray), dhash(gray)
+
+
+def hamming_distances(codes, code):
+    """Bit distance between one 64-bit code and every entry of a uint64 array."""
+    xor = np.bitwise_xor(np.asarray(codes, dtype='uint64'), np.uint64(code))
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(xor).astype('int64')
+    return _POPCOUNT_8[xor.view('uint8')].reshape(-1, 8).sum(axis=1).astype('int64')
+
+
+class HammingIndex:
+    """
+    Multi-index hashing over packed 64-bit codes.
+
+    Each code is cut into `max_distance + 1` bands and every band gets its own exact-match
+    table. By the pigeonhole principle any code within `max_distance` bits of a query agrees
+    with it on at least one band, so a lookup only verifies the rows sharing a band value.
+    """
+
+    def __init__(self, codes, max_distance=NEAR_DUPLICATE_DISTANCE):
+        self.codes = np.ascontiguousarray(codes, dtype='uint64')
+        self.max_distance = max_distance
+        n_bands = max_distance + 1
+        width = HASH_BITS // n_bands
+        self._bands = [(b * width, HASH_BITS - b * width if b == n_bands - 1 else width) for b in range(n_bands)]
+        self._tables = []
+        for shift, bits in self._bands:
+            values = self._band_values(self.codes, shift, bits)
+            order = np.argsort(values, kind='stable')
+            keys, starts = np.unique(values[order], return_index=True)
+            self._tables.append(dict(zip(keys.tolist(), np.split(order, starts[1:]))))
+
+    @staticmethod
+    def _band_values(codes, shift, bits):
+        mask = np.uint64((1 << bits) - 1)
+        return (np.asarray(codes, dtype='uint64') >> np.uint64(shift)) & mask
+
+    def __len__(self):
+        return len(self.codes)
+
+    def search(self, code, max_distance=None):
+        """Rows within `max_distance` bits of `code` as (row, distance) pairs, closest first."""
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        candidates = []
+        for (shift, bits), table in zip(self._bands, self._tables):
+            value = int(self._band_values(np.uint64(code), shift, bits))
+            if value in table:
+                candidates.append(table[value])
+        if not candidates:
+            return []
+        rows = np.unique(np.concatenate(candidates))
+        distances = hamming_distances(self.codes[rows], code)
+        keep = distances <= max_distance
+        rows, distances = rows[keep], distances[keep]
+        order = np.lexsort((rows, distances))
+        return list(zip(rows[order].tolist(), distances[order].tolist()))
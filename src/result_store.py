@@ -0,0 +1,57 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+
+DEFAULT_TTL = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    expires REAL NOT NULL
+)
+"""
+
+
+class ResultStore:
+    """
+    Server-side store for analysis results, kept out of the cookie session.
+
+    Results are saved as zlib-compressed JSON in a SQLite table under a random id that
+    is the only thing the session has to carry. Entries expire `ttl` seconds after they
+    were saved; expired entries are deleted whenever a new result is saved.
+    """
+
+    def __init__(self, db_path, ttl=DEFAULT_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def put(self, results):
+        """Saves a results dict and returns its id."""
+        result_id = uuid.uuid4().hex
+        data = zlib.compress(json.dumps(results, default=str).encode('utf-8'))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM results WHERE expires < ?", (now,))
+            conn.execute("INSERT INTO results (id, data, expires) VALUES (?, ?, ?)", (result_id, data, now + self.ttl))
+        return result_id
+
+    def get(self, result_id):
+        """The results saved under `result_id`, or None when unknown or expired."""
+        if not result_id:
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM results WHERE id = ? AND expires >= ?",
+                               (result_id, time.time())).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+
+def make_session(pool_size=16, retries=3):
+    """requests.Session with a connection pool shared by all worker threads and retries on 429/5xx."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=('GET',))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`; reserve() books the next token."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self, now):
+        """Takes one token (the balance goes negative when it is not there yet); returns the wait."""
+        wait = self.wait_time(now)
+        self.tokens -= 1
+        return wait
+
+
+class KeyRateLimiter:
+    """
+    Per-key token buckets for a pool of API keys. acquire() hands out the key whose next
+    token is available soonest and sleeps until then, so every key stays within its rate.
+    """
+
+    def __init__(self, keys, rate, burst=1):
+        if not keys:
+            raise ValueError("At least one API key is required.")
+        self._buckets = {key: TokenBucket(rate, burst) for key in keys}
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            key = min(self._buckets, key=lambda k: self._buckets[k].wait_time(now))
+            wait = self._buckets[key].reserve(now)
+        if wait > 0:
+            time.sleep(wait)
+        return key
+
+
+class Checkpoint:
+    """
+    Scraper progress in a JSON file, saved atomically (tmp file + os.replace) so a crashed
+    run can resume. `state` is a dict whose content is up to the scraper.
+    """
+
+    def __init__(self, path, default):
+        self.path = path
+        self._lock = threading.Lock()
+        self.state = default
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[WARN] Ignoring unreadable checkpoint {path}: {e}")
+
+    def update(self, change, save=True):
+        """
+        Applies `change(state)` under the lock and saves the result; with save=False the
+        change stays in memory until the next save(), for callers that flush in batches.
+        """
+        with self._lock:
+            result = change(self.state)
+            if save:
+                self._write()
+            return result
+
+    def save(self):
+        with self._lock:
+            self._write()
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
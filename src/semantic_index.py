@@ -0,0 +1,265 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import numpy as np
+
+from src.document_similarity import load_descriptions, iter_text_chunks, top_k_indices
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+BATCH_SIZE = 64
+# Characters per piece when a long upload is embedded piecewise and averaged
+EMBED_PIECE_SIZE = 2000
+MAX_EMBED_PIECES = 32
+
+CODES_FILE = 'codes.npy'
+SCALES_FILE = 'scales.npy'
+CENTROIDS_FILE = 'centroids.npy'
+LIST_ORDER_FILE = 'list_order.npy'
+LIST_OFFSETS_FILE = 'list_offsets.npy'
+DOCUMENTS_FILE = 'documents.json'
+META_FILE = 'meta.json'
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def quantize(vectors):
+    """Symmetric per-row int8 quantisation: returns (codes, scales) with vectors ~= codes * scales."""
+    vectors = np.asarray(vectors, dtype='float32')
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype('int8')
+    return codes, scales.astype('float32')
+
+
+def kmeans(vectors, n_clusters, iterations=20, seed=42):
+    """Spherical k-means on L2-normalised vectors; returns unit-length centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class EmbeddingCache:
+    """sentence-transformers encoder with a float16 on-disk cache keyed by the SHA-256 of the text."""
+
+    def __init__(self, cache_dir, model_name=DEFAULT_MODEL, encoder=None):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self._encoder = encoder
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            with self._lock:
+                if self._encoder is None:
+                    try:
+                        from sentence_transformers import SentenceTransformer
+                    except ImportError as e:
+                        raise ImportError("Semantic search requires the 'sentence-transformers' package.") from e
+                    self._encoder = SentenceTransformer(self.model_name, device='cpu')
+        return self._encoder
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.npy')
+
+    def embed(self, texts):
+        """L2-normalised float32 embeddings, encoding only the texts not seen before (in batches)."""
+        keys = [text_key(text) for text in texts]
+        embeddings = [None] * len(texts)
+        missing = []
+        for i, key in enumerate(keys):
+            path = self._path(key)
+            if os.path.exists(path):
+                embeddings[i] = np.load(path).astype('float32')
+            else:
+                missing.append(i)
+        if missing:
+            encoded = self.encoder.encode([texts[i] for i in missing], batch_size=BATCH_SIZE,
+                                          convert_to_numpy=True, normalize_embeddings=True)
+            for i, vector in zip(missing, encoded):
+                path = self._path(keys[i])
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Written under a temporary name first, so a concurrent reader never loads a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        np.save(f, vector.astype('float16'))
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+                embeddings[i] = vector.astype('float32')
+        if not embeddings:
+            return np.zeros((0, 0), dtype='float32')
+        return np.vstack(embeddings)
+
+
+class SemanticIndex:
+    """
+    Approximate nearest-neighbour search over description embeddings (IVF).
+
+    Embeddings are stored int8-quantised with a per-row scale and memory-mapped on load.
+    The corpus is partitioned by spherical k-means into ~sqrt(N) inverted lists; a query
+    is compared with the centroids, and only the `n_probe` closest lists are scored.
+    """
+
+    def __init__(self, index_dir, embeddings, n_probe=8):
+        self.index_dir = index_dir
+        self.embeddings = embeddings
+        self.n_probe = n_probe
+        self._lock = threading.Lock()
+        self._state = None
+        self.meta = {}
+
+    def _path(self, name):
+        return os.path.join(self.index_dir, name)
+
+    def snapshot(self):
+        return self._state
+
+    def load(self):
+        try:
+            with open(self._path(META_FILE), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(DOCUMENTS_FILE), 'r', encoding='utf-8') as f:
+                documents = json.load(f)
+            state = {
+                'codes': np.load(self._path(CODES_FILE), mmap_mode='r'),
+                'scales': np.load(self._path(SCALES_FILE), mmap_mode='r'),
+                'centroids': np.load(self._path(CENTROIDS_FILE)),
+                'list_order': np.load(self._path(LIST_ORDER_FILE), mmap_mode='r'),
+                'list_offsets': np.load(self._path(LIST_OFFSETS_FILE)),
+                'products': documents['products'],
+                'descriptions': documents['descriptions'],
+            }
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"Semantic index not loaded from '{self.index_dir}': {e}")
+            return False
+        self._state, self.meta = state, meta
+        return True
+
+    def build(self, products, descriptions, meta=None):
+        """Embeds the corpus (cached per text), clusters it and persists the index."""
+        if not descriptions:
+            raise ValueError("No valid descriptions found in the CSV file.")
+        vectors = self.embeddings.embed(descriptions)
+        codes, scales = quantize(vectors)
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        centroids = kmeans(vectors, n_lists)
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        list_order = np.argsort(assignment, kind='stable')
+        list_offsets = np.searchsorted(assignment[list_order], np.arange(n_lists + 1))
+
+        with self._lock:
+            os.makedirs(self.index_dir, exist_ok=True)
+            arrays = {CODES_FILE: codes, SCALES_FILE: scales, CENTROIDS_FILE: centroids.astype('float32'),
+                      LIST_ORDER_FILE: list_order, LIST_OFFSETS_FILE: list_offsets}
+            for name, array in arrays.items():
+                with open(self._path(name + '.tmp'), 'wb') as f:
+                    np.save(f, array)
+            with open(self._path(DOCUMENTS_FILE + '.tmp'), 'w', encoding='utf-8') as f:
+                json.dump({'products': list(products), 'descriptions': list(descriptions)}, f, ensure_ascii=False)
+            with open(self._path(META_FILE + '.tmp'), 'w', encoding='utf-8') as f:
+                json.dump(dict(meta or {}), f)
+            for name in list(arrays) + [DOCUMENTS_FILE, META_FILE]:
+                os.replace(self._path(name + '.tmp'), self._path(name))
+            self._state = {
+                'codes': codes, 'scales': scales, 'centroids': centroids.astype('float32'),
+                'list_order': list_order, 'list_offsets': list_offsets,
+                'products': list(products), 'descriptions': list(descriptions),
+            }
+            self.meta = dict(meta or {})
+
+    def sync(self, csv_path):
+        """Rebuilds when the descriptions CSV changed; unchanged descriptions come from the embedding cache."""
+        stat = os.stat(csv_path)
+        fingerprint = [stat.st_mtime_ns, stat.st_size]
+        if self._state is not None and self.meta.get('fingerprint') == fingerprint:
+            return
+        products, descriptions, _ = load_descriptions(csv_path)
+        self.build(products, descriptions, {'fingerprint': fingerprint, 'model': self.embeddings.model_name})
+
+    def search(self, query_vector, top_n=10, state=None):
+        """(positions, cosine scores) of the approximate top_n neighbours of a unit query vector."""
+        state = state or self._state
+        query = np.asarray(query_vector, dtype='float32').ravel()
+        offsets = state['list_offsets']
+        probes = top_k_indices(state['centroids'] @ query, self.n_probe)
+        candidates = np.concatenate([state['list_order'][offsets[p]:offsets[p + 1]] for p in probes])
+        if not len(candidates):
+            return np.zeros(0, dtype=int), np.zeros(0, dtype='float32')
+        candidates = np.sort(candidates)
+        scores = (np.asarray(state['codes'][candidates], dtype='float32') @ query) * state['scales'][candidates]
+        best = top_k_indices(scores, top_n)
+        return candidates[best], scores[best]
+
+    def embed_file(self, path):
+        """Mean embedding of an uploaded text file, embedded in pieces read in streaming chunks."""
+        pieces, buffer = [], ''
+        for chunk in iter_text_chunks(path):
+            buffer += chunk
+            while len(buffer) >= EMBED_PIECE_SIZE and len(pieces) < MAX_EMBED_PIECES:
+                pieces.append(buffer[:EMBED_PIECE_SIZE])
+                buffer = buffer[EMBED_PIECE_SIZE:]
+            if len(pieces) >= MAX_EMBED_PIECES:
+                break
+        if buffer.strip() and len(pieces) < MAX_EMBED_PIECES:
+            pieces.append(buffer)
+        pieces = [piece for piece in pieces if piece.strip()]
+        if not pieces:
+            return None
+        vector = self.embeddings.embed(pieces).mean(axis=0)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_semantic_index(csv_path='src/product_descriptions.csv', index_dir=None, model_name=DEFAULT_MODEL):
+    """Process-wide SemanticIndex for a descriptions CSV, loaded from disk and synced with the CSV."""
+    base = os.path.splitext(csv_path)[0]
+    index_dir = index_dir or base + '_semantic_index'
+    with _indexes_lock:
+        index = _indexes.get(index_dir)
+        if index is None:
+            index = SemanticIndex(index_dir, EmbeddingCache(base + '_embedding_cache', model_name))
+            index.load()
+            _indexes[index_dir] = index
+        index.sync(csv_path)
+    return index
+
+
+def get_top_semantic_docs_for_file(uploaded_path, csv_path='src/product_descriptions.csv', top_n=10):
+    """Semantic counterpart of document_similarity.get_top_similar_docs_for_file, same result format."""
+    index = get_semantic_index(csv_path)
+    state = index.snapshot()
+    query = index.embed_file(uploaded_path)
+    if query is None:
+        return []
+    positions, scores = index.search(query, top_n, state)
+    results = []
+    for idx, score in zip(positions.tolist(), scores.tolist()):
+        product = state['products'][idx]
+        results.append({
+            'filename': f"{product} (Row {idx + 1})",
+            'product': product,
+            'score': float(score),
+            'snippet': state['descriptions'][idx][:300].replace('\n', ' ')
+        })
+    return results
@@ -0,0 +1,67 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Multi-pattern substring matcher. All patterns are compiled into one automaton, so
+    a text is scanned once no matter how many patterns are being looked for.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern_id, pattern in enumerate(self.patterns):
+            node = 0
+            for char in pattern:
+                if char not in self._goto[node]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][char] = len(self._goto) - 1
+                node = self._goto[node][char]
+            self._out[node].append(pattern_id)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text):
+        """Set of patterns that occur anywhere in `text`."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                found.update(out[node])
+        return {self.patterns[pattern_id] for pattern_id in found}
+
+    def first_matches(self, texts):
+        """
+        {pattern: index of the first text containing it} in a single pass over `texts`,
+        stopping early once every pattern has been seen. The empty pattern matches the
+        first text, as with the `in` operator.
+        """
+        remaining = set(self.patterns)
+        matches = {}
+        for index, text in enumerate(texts):
+            if not remaining:
+                break
+            if '' in remaining:
+                matches[''] = index
+                remaining.discard('')
+            for pattern in self.find(text) & remaining:
+                matches[pattern] = index
+                remaining.discard(pattern)
+        return matches
@@ -0,0 +1,41 @@
+# Shared fixtures
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+# Tests import the application modules as `src.<module>`
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Starts a local HTTP server for the scraper tests: `stub_server(respond)` returns its
+    base URL, and every GET is answered with the bytes of `respond(url, base_url)`, where
+    `url` is the parsed request path. Servers are stopped after the test.
+    """
+    servers = []
+
+    def start(respond):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = respond(urlparse(self.path), f"http://127.0.0.1:{self.server.server_port}")
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,48 @@
+# Tests for anomaly_detector
+import numpy as np
+import pandas as pd
+
+from src import anomaly_detector
+from src.anomaly_detector import FEATURES, get_market_models, is_anomalous, score_batch
+
+
+def _market(seed, n=80):
+    rng = np.random.default_rng(seed)
+    quantity = rng.lognormal(3, 0.4, n)
+    return pd.DataFrame({'Quantity': quantity, 'Net Weight (kg)': quantity * rng.normal(2.5, 0.2, n),
+                         'Total Value (USD)': quantity * rng.normal(3.0, 0.3, n)})
+
+
+def test_batch_scores_match_per_point_results():
+    market = _market(1)
+    points = np.vstack([market[FEATURES].to_numpy()[:20], [[5000.0, 1.0, 1e6], [1.0, 900.0, 2.0]]])
+    anomaly, risk_score = score_batch(market, points)
+    expected = [is_anomalous(market, point) for point in points]
+    assert [(bool(flag), float(risk)) for flag, risk in zip(anomaly, risk_score)] == expected
+    assert anomaly[-2:].all()
+
+
+def test_the_same_market_data_is_fitted_once(monkeypatch):
+    fits = []
+    fit = anomaly_detector.fit_market_model
+    monkeypatch.setattr(anomaly_detector, 'fit_market_model', lambda *args: fits.append(1) or fit(*args))
+    market = _market(2)
+    first = score_batch(market, market[FEATURES].to_numpy())
+    second = score_batch(market.copy(), market[FEATURES].to_numpy())
+    assert len(fits) == 1
+    assert np.array_equal(first[1], second[1])
+
+
+def test_pool_fits_match_in_process_fits_and_follow_the_requested_size():
+    segments = {'a': _market(3), 'b': _market(4)}
+    try:
+        pool = anomaly_detector._get_pool(1)
+        assert anomaly_detector._get_pool(1) is pool
+        assert anomaly_detector._get_pool(2) is not pool
+        anomaly_detector._models.clear()
+        pooled = get_market_models(segments, max_workers=2)
+    finally:
+        anomaly_detector.shutdown_pool()
+    for label, market in segments.items():
+        local = anomaly_detector.fit_market_model(market)
+        assert pooled[label]['min_score'] == local['min_score'] and pooled[label]['max_score'] == local['max_score']
@@ -0,0 +1,36 @@
+# Tests for anomaly_detector segments
+import numpy as np
+import pandas as pd
+
+from src.anomaly_detector import FEATURES, fit_market_model, score_points, score_segments
+
+
+def _market():
+    rng = np.random.default_rng(0)
+    n = 60
+    quantity = rng.lognormal(3, 0.3, n)
+    return pd.DataFrame({
+        'HS Code': [8413.0] * 20 + [np.nan] * 20 + [8501.0] * 20,
+        'Category': ['Pump'] * 40 + ['Electric Motor'] * 20,
+        'Quantity': quantity, 'Net Weight (kg)': quantity * 2.5, 'Total Value (USD)': quantity * 3.0,
+    })
+
+
+def test_rows_without_hs_code_fall_back_to_their_category():
+    bom = pd.DataFrame({
+        'HS Code': [8413.0, np.nan, np.nan, ''],
+        'Category': ['Pump', ' pump ', 'Gearbox', 'Electric Motor'],
+        'Quantity': [20.0] * 4, 'Net Weight (kg)': [50.0] * 4, 'Total Value (USD)': [60.0] * 4,
+    })
+    segments = [result['segment'] for result in score_segments(_market(), bom, max_workers=1)]
+    assert segments == ['HS Code 8413.0', 'Category pump', 'All', 'Category electric motor']
+
+
+def test_risk_scores_are_clipped_to_0_100():
+    market = _market()
+    fitted = fit_market_model(market)
+    # Scores outside the recorded range of the market data must not leave 0-100
+    middle = (fitted['min_score'] + fitted['max_score']) / 2
+    narrowed = dict(fitted, min_score=middle - 1e-3, max_score=middle + 1e-3)
+    _, risk_score = score_points(narrowed, market[FEATURES].to_numpy())
+    assert risk_score.min() == 0 and risk_score.max() == 100
@@ -0,0 +1,85 @@
+# Tests for batch_screen
+import os
+import json
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+from app import batch_screen
+from app.batch_screen import collect_submissions, load_checkpoint, main
+
+
+class Args:
+    def __init__(self, **values):
+        self.bom_dir = self.image_dir = self.doc_dir = self.manifest = None
+        self.brand_folder = 'all'
+        self.__dict__.update(values)
+
+
+def _touch(path, content='x'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def test_directories_and_manifest_rows_become_submissions(tmp_path):
+    _touch(tmp_path / 'boms' / 'b.csv')
+    _touch(tmp_path / 'boms' / 'a.csv')
+    _touch(tmp_path / 'boms' / 'notes.txt')
+    _touch(tmp_path / 'images' / 'Logo.PNG')
+    _touch(tmp_path / 'batch' / 'files' / 'spec.txt')
+    _touch(tmp_path / 'batch' / 'manifest.csv', "id,bom,image,doc,brand_folder\n"
+                                                "s1,,,files/spec.txt,Brand A\n"
+                                                "s2,files/missing.csv,, ,\n")
+    args = Args(bom_dir=str(tmp_path / 'boms'), image_dir=str(tmp_path / 'images'),
+                manifest=str(tmp_path / 'batch' / 'manifest.csv'))
+
+    submissions = collect_submissions(args)
+    assert [s['id'] for s in submissions] == ['bom:a.csv', 'bom:b.csv', 'image:Logo.PNG', 's1', 's2']
+    assert submissions[0]['inputs'] == {'brand_folder': 'all', 'bom_path': str(tmp_path / 'boms' / 'a.csv')}
+    assert submissions[3]['inputs'] == {'brand_folder': 'Brand A',
+                                        'doc_path': str(tmp_path / 'batch' / 'files' / 'spec.txt')}
+    assert submissions[4]['inputs'] == {'brand_folder': 'all',
+                                        'bom_path': str(tmp_path / 'batch' / 'files' / 'missing.csv')}
+
+
+def test_rerun_skips_submissions_in_the_checkpoint(tmp_path, capsys):
+    _touch(tmp_path / 'boms' / 'a.csv')
+    _touch(tmp_path / 'boms' / 'b.csv')
+    output = str(tmp_path / 'findings.jsonl')
+    _touch(output + '.done', "bom:a.csv\n\nbom:b.csv\n")
+    assert load_checkpoint(output + '.done') == {'bom:a.csv', 'bom:b.csv'}
+    assert load_checkpoint(str(tmp_path / 'absent.done')) == set()
+
+    # Everything is done already, so the app and its worker pool are never started
+    assert main(['--bom-dir', str(tmp_path / 'boms'), '--output', output]) == 0
+    assert "2 submissions already screened, 0 to go." in capsys.readouterr().out
+
+
+def test_resumed_run_screens_only_the_remaining_submissions(tmp_path, monkeypatch):
+    for name in ('a.csv', 'b.csv', 'c.csv'):
+        _touch(tmp_path / 'boms' / name)
+    output = str(tmp_path / 'findings.jsonl')
+    _touch(output, json.dumps({'Submission': 'bom:a.csv'}) + '\n')
+    _touch(output + '.done', "bom:a.csv\n")
+
+    screened = []
+
+    def run_analysis(inputs):
+        screened.append(os.path.basename(inputs['bom_path']))
+        return {'bom': {'high': [{'Product': os.path.basename(inputs['bom_path'])}]}}
+
+    # A stand-in for app.py, and the worker pool run in-process
+    fake_app = types.SimpleNamespace(app=types.SimpleNamespace(config={}), run_analysis=run_analysis)
+    monkeypatch.setitem(batch_screen.sys.modules, 'app', fake_app)
+    monkeypatch.setattr(batch_screen, '_app', None)
+    monkeypatch.setattr(batch_screen, 'warm_indexes', lambda screening_app: None)
+    monkeypatch.setattr(batch_screen, 'ProcessPoolExecutor',
+                        lambda max_workers, mp_context, initializer: ThreadPoolExecutor(1, initializer=initializer))
+
+    assert main(['--bom-dir', str(tmp_path / 'boms'), '--output', output]) == 0
+    assert sorted(screened) == ['b.csv', 'c.csv']
+    with open(output, encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert [record['Submission'] for record in records[:1]] == ['bom:a.csv']
+    assert sorted(record['Submission'] for record in records[1:]) == ['bom:b.csv', 'bom:c.csv']
+    assert load_checkpoint(output + '.done') == {'bom:a.csv', 'bom:b.csv', 'bom:c.csv'}
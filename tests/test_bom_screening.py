@@ -0,0 +1,55 @@
+# Tests for bom_screening
+import numpy as np
+import pandas as pd
+
+from src.bom_screening import ExportIndex, screen_bom
+
+
+def _row_loop(bom_df, export_df):
+    """The per-row screening loop app.py ran before the hash indexes."""
+    results = {'high': [], 'moderate': [], 'low': []}
+    for _, row in bom_df.iterrows():
+        category = str(row.get('Category', '')).strip()
+        hs_code = str(row.get('HS Code', '')).strip()
+        row_data = {"Category": category, "HS Code": hs_code, "Company": row.get("Company", "N/A"),
+                    "Product": row.get("Product", "N/A")}
+        categories = export_df['Category'].str.strip().str.lower()
+        hs_codes = export_df['HS Code'].astype(str).str.strip()
+        if not export_df[(categories == category.lower()) & (hs_codes == hs_code)].empty:
+            row_data.update({"Risk Level": "High", "Finding": "Category and HS Code both found in export list."})
+            results['high'].append(row_data)
+        elif not export_df[hs_codes == hs_code].empty or not export_df[categories == category.lower()].empty:
+            row_data.update({"Risk Level": "Moderate", "Finding": "Either Category or HS Code matches, but not both."})
+            results['moderate'].append(row_data)
+        elif any(category.lower() in str(desc).lower() for desc in export_df['Product Description'].dropna()):
+            row_data.update({"Risk Level": "Low", "Finding": "Partial description similarity found in export list."})
+            results['low'].append(row_data)
+        else:
+            row_data.update({"Risk Level": "Low", "Finding": "No strong match, only weak/description similarity."})
+            results['low'].append(row_data)
+    return results
+
+
+def test_hash_indexed_screening_matches_the_row_loop():
+    rng = np.random.default_rng(7)
+    categories = ["Electric Motor", "Gearbox", " pump ", "VALVE", "Heat Exchanger", None]
+    hs_codes = [8501.0, 8483.0, 8413.0, 8481.0, np.nan]
+    export_df = pd.DataFrame({
+        'Category': rng.choice(np.array(categories, dtype=object), 300),
+        'HS Code': rng.choice(hs_codes, 300),
+        'Product Description': rng.choice(np.array(["compact electric motor", "Industrial Boiler unit",
+                                                    "servo drive", None], dtype=object), 300),
+    })
+    bom_df = pd.DataFrame({
+        'Category': rng.choice(np.array(categories + ["Boiler", "servo", "Conveyor", "motor"], dtype=object), 200),
+        'HS Code': rng.choice(hs_codes + [9999.0, 1234.0], 200),
+        'Company': rng.choice(["Acme", "Globex"], 200),
+        'Product': [f"P{i}" for i in range(200)],
+    })
+
+    screened = screen_bom(bom_df, ExportIndex(export_df))
+    for items in screened.values():
+        for item in items:
+            item.pop('Matched Description', None)
+    assert screened == _row_loop(bom_df, export_df)
+    assert all(screened[level] for level in ('high', 'moderate', 'low'))
@@ -0,0 +1,27 @@
+# Tests for consolidation
+from src.consolidation import consolidate
+
+
+def _results(bom, image, doc):
+    return {'bom': {'high': bom, 'low': []}, 'image': {'high': image, 'moderate': [], 'low': []},
+            'doc': {'high': doc, 'moderate': [], 'low': []}, 'internal_sim': []}
+
+
+def test_first_matching_counterpart_confirms_each_item():
+    bom = [{'Category': 'Electric_Motors', 'Product': 'M1'}, {'Category': 'Pumps', 'Product': 'P1'},
+           {'Category': 'motor parts', 'Product': 'M2'}]
+    image = [{'Category': 'Valves', 'Brand Image': 'v.jpg'}, {'Category': 'Motors', 'Brand Image': 'm.jpg'},
+             {'Category': 'Electric', 'Brand Image': 'e.jpg'}]
+    results = consolidate(_results(bom, image, []))
+    findings = [item['Finding'] for item in results['internal_sim']]
+    assert findings == ["BOM high-risk item confirmed by Image (match: m.jpg)."]
+    assert [item['Product'] for item in results['bom']['high']] == ['P1', 'M2']
+    assert [item['Brand Image'] for item in results['image']['high']] == ['v.jpg', 'e.jpg']
+
+
+def test_only_the_confirmed_item_is_removed_not_equal_copies():
+    image = [{'Category': 'Pumps', 'Brand Image': 'p.jpg'}, {'Category': 'Pumps', 'Brand Image': 'p.jpg'}]
+    results = consolidate(_results([{'Category': 'Pumps', 'Product': 'P'}], image, []))
+    assert len(results['internal_sim']) == 1
+    assert results['bom']['high'] == []
+    assert results['image']['high'] == [image[1]] and results['image']['high'][0] is image[1]
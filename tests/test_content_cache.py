@@ -0,0 +1,27 @@
+# Tests for content_cache
+import io
+import os
+
+from src.content_cache import CheckCache, store_stream, file_digest, cache_key
+
+
+def test_same_content_is_stored_once_under_its_digest(tmp_path):
+    first, digest = store_stream(io.BytesIO(b"bom,data\n1,2\n"), str(tmp_path), '.CSV')
+    second, same_digest = store_stream(io.BytesIO(b"bom,data\n1,2\n"), str(tmp_path), '.csv')
+    assert first == second and digest == same_digest
+    assert os.path.basename(first) == digest + '.csv'
+    assert file_digest(first) == digest
+    assert os.listdir(tmp_path) == [digest + '.csv']
+
+
+def test_least_recently_used_results_are_evicted_past_the_size_bound(tmp_path):
+    payload = {'high': [{'Finding': os.urandom(400).hex()}]}
+    cache = CheckCache(str(tmp_path / 'cache.sqlite'), max_bytes=1200)
+    keys = [cache_key('bom', digest, 'v1') for digest in ('a', 'b', 'c')]
+    cache.put(keys[0], payload)
+    cache.put(keys[1], payload)
+    assert cache.get(keys[0]) == payload
+    cache.put(keys[2], payload)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == payload and cache.get(keys[2]) == payload
+    assert cache_key('bom', 'a', 'v2') != keys[0]
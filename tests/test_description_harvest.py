@@ -0,0 +1,39 @@
+# Tests for description harvesting, against a local mock search endpoint
+import csv
+import json
+from urllib.parse import parse_qs
+
+from src import document
+
+
+def test_harvest_checkpoints_and_dedupes_across_runs(tmp_path, monkeypatch, stub_server):
+    monkeypatch.setattr(document, 'MIN_DESCRIPTIONS', 2)
+    monkeypatch.setattr(document, 'RETRIES', 1)
+    monkeypatch.setattr(document, 'WAIT_BETWEEN_REQUESTS', 0.01)
+    product_file, output_csv, checkpoint_file = tmp_path / 'products.txt', tmp_path / 'out.csv', tmp_path / 'done.json'
+    product_file.write_text("Boiler\nNothing\n", encoding='utf-8')
+    checkpoint_file.write_text('[]', encoding='utf-8')
+    queries = []
+
+    def respond(url, base):
+        product = parse_qs(url.query)['q'][0]
+        queries.append(product)
+        results = [] if product == 'Nothing' else [
+            {'snippet': f"{product} for heavy duty use."},
+            {'snippet': f"  {product.upper()} FOR HEAVY-DUTY USE "},
+            {'snippet': f"Compact {product}."},
+        ]
+        return json.dumps({'organic_results': results}).encode()
+
+    url = stub_server(respond) + '/search.json'
+    document.main(str(product_file), str(output_csv), str(checkpoint_file), url, ['k1', 'k2'], max_workers=2)
+    with open(output_csv, newline='', encoding='utf-8') as f:
+        rows = sorted((row['Product'], row['Description']) for row in csv.DictReader(f))
+    assert rows == [('Boiler', 'Boiler for heavy duty use.'), ('Boiler', 'Compact Boiler.'),
+                    ('Nothing', 'No description found')]
+    assert sorted(json.loads(checkpoint_file.read_text())) == ['Boiler', 'Nothing']
+
+    queries.clear()
+    product_file.write_text("Boiler\nNothing\nPump\n", encoding='utf-8')
+    document.main(str(product_file), str(output_csv), str(checkpoint_file), url, ['k1'], max_workers=2)
+    assert queries == ['Pump']
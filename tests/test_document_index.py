@@ -0,0 +1,60 @@
+# Tests for document_similarity
+import os
+import time
+
+from src.document_similarity import DocumentIndex
+
+ROWS = ["Product,Description", "Motor,compact electric motor with steel housing",
+        "Pump,high pressure hydraulic pump", "Valve,stainless solenoid valve"]
+
+
+def _write(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    # Make sure every rewrite gets a new mtime, even on coarse filesystem clocks
+    stamp = time.time_ns() + len(lines) * 10 ** 9
+    os.utime(path, ns=(stamp, stamp))
+
+
+def _synced_index(tmp_path):
+    csv_path = str(tmp_path / 'descriptions.csv')
+    _write(csv_path, ROWS)
+    index = DocumentIndex(str(tmp_path / 'index'))
+    index.sync(csv_path)
+    return csv_path, index
+
+
+def _reloaded(tmp_path):
+    index = DocumentIndex(str(tmp_path / 'index'))
+    assert index.load()
+    return index
+
+
+def test_touched_csv_only_updates_the_fingerprint(tmp_path):
+    csv_path, index = _synced_index(tmp_path)
+    stamp = time.time_ns() + 10 ** 10
+    os.utime(csv_path, ns=(stamp, stamp))
+    index.sync(csv_path)
+    assert index.meta['fingerprint'][0] == stamp
+    assert _reloaded(tmp_path).meta['fingerprint'][0] == stamp
+    assert len(index) == 3
+
+
+def test_appended_rows_are_added_and_rows_without_description_are_skipped(tmp_path):
+    csv_path, index = _synced_index(tmp_path)
+    _write(csv_path, ROWS + ["Gearbox,"])
+    index.sync(csv_path)
+    assert len(index) == 3 and index.meta['rows'] == 4
+    _write(csv_path, ROWS + ["Gearbox,", "Sensor,proximity sensor module"])
+    index.sync(csv_path)
+    assert index.products == ['Motor', 'Pump', 'Valve', 'Sensor']
+    assert _reloaded(tmp_path).products == index.products
+    assert index.matrix.shape[0] == 4
+
+
+def test_rewritten_csv_rebuilds_the_index(tmp_path):
+    csv_path, index = _synced_index(tmp_path)
+    _write(csv_path, [ROWS[0], "Bearing,ball bearing with sealed steel races", ROWS[2]])
+    index.sync(csv_path)
+    assert index.products == ['Bearing', 'Pump']
+    assert 'races' in index.vectorizer.vocabulary_
@@ -0,0 +1,131 @@
+# Tests for image_index
+import os
+
+import cv2
+import numpy as np
+
+from skimage.metrics import structural_similarity as ssim
+
+from src.image_index import ImageFeatureIndex, correlation_scores, unit_histograms, histogram_from_image, \
+    grayscale_thumbnail, parallel_scan, risk_level, score_histograms, ssim_shortlist
+
+
+def _image(rng):
+    img = rng.integers(0, 255, (96, 128, 3), dtype=np.uint8)
+    img[:48, :64] = rng.integers(0, 255, 3)
+    return img
+
+
+def _blocks(rng):
+    """A few flat colour rectangles: sparse, distinct histograms."""
+    img = np.full((96, 128, 3), rng.integers(0, 255, 3), dtype=np.uint8)
+    for _ in range(4):
+        y, x = rng.integers(0, 80), rng.integers(0, 110)
+        img[y:y + rng.integers(8, 40), x:x + rng.integers(8, 60)] = rng.integers(0, 255, 3)
+    return img
+
+
+def _strength(match):
+    return ({'High': 2, 'Moderate': 1}[match['risk_level']], match['ssim'], match['correlation'])
+
+
+def test_vectorized_correlation_matches_compare_hist():
+    rng = np.random.default_rng(3)
+    hists = [histogram_from_image(_image(rng)) for _ in range(20)]
+    hists.append(np.full(512, 0.5, dtype='float32'))  # flat: OpenCV reports a correlation of 1
+    unit = unit_histograms(np.stack(hists))
+    for query in hists:
+        expected = [cv2.compareHist(query, hist, cv2.HISTCMP_CORREL) for hist in hists]
+        assert np.allclose(correlation_scores(query, unit), expected, atol=1e-4)
+
+
+def test_refresh_picks_up_added_and_removed_images(tmp_path):
+    rng = np.random.default_rng(5)
+    catalog = tmp_path / 'catalog'
+    for brand in ('Brand A', 'Brand B'):
+        os.makedirs(catalog / brand)
+        for i in range(3):
+            cv2.imwrite(str(catalog / brand / f'Co{i}.png'), _image(rng))
+    index = ImageFeatureIndex(str(catalog), str(tmp_path / 'index'))
+    assert index.refresh(force=True)
+    assert not index.refresh(force=True)
+
+    added = _image(rng)
+    cv2.imwrite(str(catalog / 'Brand B' / 'Co9.png'), added)
+    os.remove(catalog / 'Brand A' / 'Co1.png')
+    assert index.refresh(force=True)
+
+    names = [(entry['brand'], entry['name']) for entry in index.entries]
+    assert names == [('Brand A', 'Co0.png'), ('Brand A', 'Co2.png'), ('Brand B', 'Co0.png'),
+                     ('Brand B', 'Co1.png'), ('Brand B', 'Co2.png'), ('Brand B', 'Co9.png')]
+    assert np.array_equal(index.histograms[-1], histogram_from_image(added))
+    assert np.array_equal(index.thumbnails[-1], grayscale_thumbnail(added))
+
+    # The incrementally refreshed index equals one built from scratch, also after a reload
+    rebuilt = ImageFeatureIndex(str(catalog), str(tmp_path / 'rebuilt'))
+    rebuilt.refresh(force=True)
+    reloaded = ImageFeatureIndex(str(catalog), str(tmp_path / 'index'))
+    assert reloaded.load()
+    for other in (rebuilt, reloaded):
+        assert other.entries == index.entries
+        assert np.array_equal(other.histograms, index.histograms)
+        assert np.array_equal(other.thumbnails, index.thumbnails)
+        assert np.array_equal(other.hashes, index.hashes)
+
+
+def test_indexes_sharing_a_folder_reuse_each_others_builds(tmp_path):
+    rng = np.random.default_rng(9)
+    catalog = tmp_path / 'catalog'
+    os.makedirs(catalog / 'Brand A')
+    for i in range(3):
+        cv2.imwrite(str(catalog / 'Brand A' / f'Co{i}.png'), _image(rng))
+    first = ImageFeatureIndex(str(catalog), str(tmp_path / 'index'))
+    second = ImageFeatureIndex(str(catalog), str(tmp_path / 'index'))
+    assert first.refresh(force=True)
+    cv2.imwrite(str(catalog / 'Brand A' / 'Co3.png'), _image(rng))
+    assert first.refresh(force=True)
+
+    # The second process loads the published build instead of decoding the catalog again
+    assert not second.refresh(force=True)
+    assert second.version == first.version
+    assert np.array_equal(second.histograms, first.histograms)
+    leftovers = sorted(name for name in os.listdir(tmp_path / 'index') if name.endswith(('.npy', '.tmp')))
+    assert len(leftovers) == 3 and all(first._generation in name for name in leftovers)
+
+
+def test_ssim_shortlist_finds_the_same_top_match_as_scoring_the_whole_catalog(tmp_path):
+    rng = np.random.default_rng(11)
+    catalog = tmp_path / 'catalog'
+    for brand in ('Brand A', 'Brand B', 'Brand C'):
+        os.makedirs(catalog / brand)
+        for i in range(12):
+            cv2.imwrite(str(catalog / brand / f'Co{i}.png'), _blocks(rng))
+    query = _blocks(rng)
+    # A slightly altered copy, and a decoy with the same colours but shuffled pixels
+    altered = np.clip(query.astype(int) + rng.integers(-12, 12, query.shape), 0, 255).astype(np.uint8)
+    cv2.imwrite(str(catalog / 'Brand B' / 'Copy.png'), altered)
+    cv2.imwrite(str(catalog / 'Brand C' / 'Decoy.png'), rng.permutation(query.reshape(-1, 3)).reshape(query.shape))
+    query_hist, query_gray = histogram_from_image(query), grayscale_thumbnail(query)
+
+    full, complete = parallel_scan(str(catalog), query_hist, query_gray, max_workers=1)
+    assert complete
+
+    index = ImageFeatureIndex(str(catalog), str(tmp_path / 'index'))
+    index.refresh(force=True)
+    hist_result = score_histograms(query_hist, index.snapshot()['unit_histograms'], top_k=3)
+    shortlist = ssim_shortlist(hist_result, 3)
+    assert len(shortlist) < len(index.entries)
+    shortlisted = []
+    for row in shortlist:
+        correlation = float(hist_result['scores'][row])
+        ssim_score = round(float(ssim(query_gray, index.thumbnails[row])), 4)
+        level = risk_level(correlation, ssim_score)
+        if level != "Low":
+            shortlisted.append({'brand': index.entries[row]['brand'], 'name': index.entries[row]['name'],
+                                'correlation': correlation, 'ssim': ssim_score, 'risk_level': level})
+
+    best, shortlist_best = max(full, key=_strength), max(shortlisted, key=_strength)
+    assert (best['brand'], best['name']) == ('Brand B', 'Copy.png')
+    assert {key: shortlist_best[key] for key in ('brand', 'name', 'risk_level', 'ssim')} == \
+        {key: best[key] for key in ('brand', 'name', 'risk_level', 'ssim')}
+    assert np.isclose(shortlist_best['correlation'], best['correlation'], atol=1e-5)
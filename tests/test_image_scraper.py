@@ -0,0 +1,37 @@
+# Tests for the image scraper, against a local stub search/image server
+import json
+from urllib.parse import parse_qs
+
+from src import image_similarity
+
+IMAGES = {'/img/1': b'first', '/img/2': b'second', '/img/copy': b'first'}
+
+
+def test_scrape_dedupes_by_content_and_resumes(tmp_path, monkeypatch, stub_server):
+    monkeypatch.setattr(image_similarity, 'NUM_IMAGES', 2)
+    monkeypatch.setattr(image_similarity, 'RETRY_LIMIT', 1)
+    monkeypatch.setattr(image_similarity, 'SLEEP_BETWEEN_ATTEMPTS', 0.01)
+    requests_seen = []
+
+    def respond(url, base):
+        requests_seen.append(url.path)
+        if url.path != '/search.json':
+            return IMAGES[url.path]
+        product = parse_qs(url.query)['q'][0]
+        return json.dumps({'images_results': [
+            {'title': f"Acme Pro {product}", 'original': base + '/img/1'},
+            {'title': f"Other Brand {product}", 'original': base + '/img/copy'},
+            {'title': f"Third Co {product}", 'original': base + '/img/2'},
+            {'title': "Unrelated", 'original': base + '/img/2'},
+        ]}).encode()
+
+    search_url = stub_server(respond) + '/search.json'
+    image_similarity.scrape_images(['Air Compressor'], str(tmp_path), search_url, ['k1', 'k2'], max_workers=2)
+    folder = tmp_path / 'Air_Compressor'
+    metadata = json.loads((folder / 'metadata.json').read_text())
+    assert [item['brand'] for item in metadata] == ['Acme_Pro', 'Third_Co']
+    assert sorted(path.read_bytes() for path in folder.glob('*.jpg')) == [b'first', b'second']
+
+    requests_seen.clear()
+    image_similarity.scrape_images(['Air Compressor'], str(tmp_path), search_url, ['k1'], max_workers=2)
+    assert requests_seen == []
@@ -0,0 +1,51 @@
+# Tests for job_queue
+import json
+import time
+import sqlite3
+
+from flask import Flask, jsonify
+from src.job_queue import JobQueue
+
+
+def _wait(queue, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _reject(constant):
+    raise ValueError(f"invalid JSON constant {constant}")
+
+
+def test_status_of_a_result_with_empty_cells_is_strict_json(tmp_path):
+    def runner(inputs, progress):
+        return {'bom': {'high': [{'Company': float('nan'), 'Product': 'P1', 'Quantity': 3.0}]}}
+
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite'), runner, max_workers=1)
+    job = _wait(queue, queue.submit({'bom_path': 'bom.csv'}))
+    with Flask(__name__).app_context():
+        body = jsonify(job).get_data(as_text=True)
+    parsed = json.loads(body, parse_constant=_reject)
+    assert parsed['result']['bom']['high'] == [{'Company': None, 'Product': 'P1', 'Quantity': 3.0}]
+
+
+def test_only_jobs_of_silent_owners_are_requeued_and_old_results_purged(tmp_path):
+    db_path = str(tmp_path / 'jobs.sqlite')
+    queue = JobQueue(db_path, lambda inputs, progress: {'ran': inputs['name']}, max_workers=1, ttl=3600)
+    now = time.time()
+    with sqlite3.connect(db_path) as conn:
+        rows = [('live', 'running', 'other-host:1', now, now), ('crashed', 'running', 'other-host:2', now - 600, now),
+                ('expired', 'done', 'other-host:3', now - 7200, now - 7200)]
+        for job_id, status, owner, heartbeat, updated in rows:
+            conn.execute("INSERT INTO jobs (id, status, progress, inputs, created, updated, owner, heartbeat) "
+                         "VALUES (?, ?, 0, ?, ?, ?, ?, ?)",
+                         (job_id, status, json.dumps({'name': job_id}), updated, updated, owner, heartbeat))
+
+    assert _wait(queue, 'crashed')['result'] == {'ran': 'crashed'}
+    assert queue.get('live')['status'] == 'running'
+    _wait(queue, queue.submit({'name': 'new'}))
+    assert queue.get('expired') is None
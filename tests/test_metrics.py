@@ -0,0 +1,29 @@
+# Tests for metrics
+from src.metrics import Registry, collect_spans, reset_spans
+
+
+def test_render_counters_and_histograms_in_prometheus_text():
+    registry = Registry(buckets=(0.1, 1.0))
+    registry.inc('ssim_calls_total', 3)
+    registry.inc('cache_requests_total', cache='export_master', result='hit')
+    registry.observe('stage_duration_seconds', 0.5, stage='bom')
+    registry.observe('stage_duration_seconds', 2.0, stage='bom')
+    lines = registry.render().splitlines()
+    assert 'ssim_calls_total 3' in lines
+    assert 'cache_requests_total{cache="export_master",result="hit"} 1' in lines
+    assert '# TYPE stage_duration_seconds histogram' in lines
+    assert 'stage_duration_seconds_bucket{stage="bom",le="0.1"} 0' in lines
+    assert 'stage_duration_seconds_bucket{stage="bom",le="1.0"} 1' in lines
+    assert 'stage_duration_seconds_bucket{stage="bom",le="+Inf"} 2' in lines
+    assert 'stage_duration_seconds_count{stage="bom"} 2' in lines
+
+
+def test_spans_stop_being_collected_after_reset():
+    registry = Registry()
+    spans, token = collect_spans()
+    with registry.span('profiled'):
+        pass
+    reset_spans(token)
+    with registry.span('later'):
+        pass
+    assert [stage for stage, _ in spans] == ['profiled']
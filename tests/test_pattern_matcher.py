@@ -1 +1,36 @@
 # Tests for pattern matcher
+import numpy as np
+import pandas as pd
+
+from src.pattern_matcher import compute_match, compute_match_many
+
+
+def _bom():
+    return pd.DataFrame({
+        'Product Description': ['Motor', 'Pump', 'Valve', np.nan, 'Motor'],
+        'Origin Country': ['IN', 'CN', 'DE', 'IN', 'US'],
+    })
+
+
+def _buyer():
+    return pd.DataFrame({
+        'Description': ['Motor', 'Motor', 'Valve', np.nan, 'Pump'],
+        'Origin Country': ['IN', 'IN', 'FR', 'IN', 'CN'],
+    })
+
+
+def test_compute_match_counts_description_and_origin_pairs():
+    assert compute_match(_bom(), _buyer()) == 2 / 5
+
+
+def test_compute_match_empty_bom():
+    assert compute_match(_bom().iloc[:0], _buyer()) == 0
+
+
+def test_compute_match_many_matches_single_buyer_scores():
+    other = pd.DataFrame({'Description': ['Valve', 'Motor'], 'Origin Country': ['DE', 'US']})
+    empty = pd.DataFrame({'Description': [], 'Origin Country': []})
+    buyers = {'a': _buyer(), 'b': other, 'c': empty}
+    ratios = compute_match_many(_bom(), buyers)
+    assert ratios == {label: compute_match(_bom(), df) for label, df in buyers.items()}
+    assert compute_match_many(_bom(), list(buyers.values())) == list(ratios.values())
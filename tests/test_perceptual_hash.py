@@ -0,0 +1,25 @@
+# Tests for perceptual_hash
+import numpy as np
+
+from src.perceptual_hash import HammingIndex, NEAR_DUPLICATE_DISTANCE
+
+
+def _flip(code, bits):
+    for bit in bits:
+        code ^= 1 << int(bit)
+    return code
+
+
+def test_search_matches_brute_force_hamming_distance():
+    rng = np.random.default_rng(11)
+    codes = [int(code) for code in rng.integers(0, 2 ** 63, 500, dtype=np.uint64)]
+    # Near copies of the first codes, 0 to 9 bits apart, so hits sit on both sides of the threshold
+    codes += [_flip(codes[i], rng.choice(64, i % 10, replace=False)) for i in range(100)]
+    index = HammingIndex(np.array(codes, dtype='uint64'))
+
+    for query in codes[:60] + [_flip(codes[3], [0, 17, 40])]:
+        for max_distance in (None, 2):
+            limit = NEAR_DUPLICATE_DISTANCE if max_distance is None else max_distance
+            expected = sorted((bin(code ^ query).count('1'), row) for row, code in enumerate(codes))
+            expected = [(row, distance) for distance, row in expected if distance <= limit]
+            assert index.search(query, max_distance) == expected
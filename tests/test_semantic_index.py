@@ -0,0 +1,46 @@
+# Tests for semantic_index
+import os
+
+import numpy as np
+
+from src.semantic_index import EmbeddingCache, SemanticIndex
+
+
+class FakeEncoder:
+    """Stands in for sentence-transformers: 'topic T item I' texts lie close to topic T's direction."""
+
+    def __init__(self, dims=32, topics=8, seed=0):
+        rng = np.random.default_rng(seed)
+        self.centers = rng.normal(size=(topics, dims))
+        self.calls = 0
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, normalize_embeddings=True):
+        self.calls += 1
+        vectors = []
+        for text in texts:
+            topic, item = int(text.split()[1]), int(text.split()[3])
+            noise = np.random.default_rng(1000 * topic + item).normal(scale=0.35, size=self.centers.shape[1])
+            vectors.append(self.centers[topic] + noise)
+        vectors = np.asarray(vectors)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_ivf_top_k_matches_exact_cosine_search(tmp_path):
+    encoder = FakeEncoder()
+    embeddings = EmbeddingCache(str(tmp_path / 'cache'), encoder=encoder)
+    descriptions = [f"topic {t} item {i}" for t in range(8) for i in range(25)]
+    index = SemanticIndex(str(tmp_path / 'index'), embeddings)
+    index.build([f"P{i}" for i in range(len(descriptions))], descriptions)
+    vectors = embeddings.embed(descriptions)
+    assert encoder.calls == 1
+    assert not [name for _, _, names in os.walk(tmp_path / 'cache') for name in names if name.endswith('.tmp')]
+
+    # Exact search over the same int8-quantised vectors: only the inverted-list probing may differ
+    state = index.snapshot()
+    stored = np.asarray(state['codes'], dtype='float32') * state['scales'][:, None]
+    for row in range(0, len(descriptions), 17):
+        query = vectors[row]
+        exact = np.argsort(-(stored @ query), kind='stable')[:5]
+        positions, scores = index.search(query, top_n=5)
+        assert set(positions.tolist()) == set(exact.tolist())
+        assert np.allclose(scores, vectors[positions] @ query, atol=0.02)